@@ -14,7 +14,8 @@ from . import (
     ops_structure,
     ops_utilities,
     ui,
-    utils
+    utils,
+    handlers
 )
 
 classes = [
@@ -22,9 +23,19 @@ classes = [
     properties.STRA_PGT_Joint,
 
     ops_structure.STRA_OT_Generate_Structure,
+    ops_structure.STRA_OT_Generate_Sharded,
     ops_structure.STRA_OT_Modify_Structure,
+    ops_structure.STRA_OT_Merge_Joints,
+    ops_structure.STRA_OT_Prune_Structure,
+    ops_structure.STRA_OT_Analyze_Structure,
 
     ops_utilities.STRA_OT_Select_Joints,
+    ops_utilities.STRA_OT_Query_Structure,
+    ops_utilities.STRA_OT_Generate_Colliders,
+    ops_utilities.STRA_OT_Fit_Collision_Shapes,
+    ops_utilities.STRA_OT_Export_Structure,
+    ops_utilities.STRA_OT_Import_Structure,
+    ops_utilities.STRA_OT_Clear_Cache,
 
     ui.STRA_PT_Joint,
     ui.STRA_PT_Utilities
@@ -37,8 +48,12 @@ def register():
     bpy.types.Scene.stra_props_structure = bpy.props.PointerProperty(type=properties.STRA_PGT_Structure)
     bpy.types.Scene.stra_props_joint = bpy.props.PointerProperty(type=properties.STRA_PGT_Joint)
 
+    handlers.register()
+
 
 def unregister():
+   handlers.unregister()
+
    for cls in reversed(classes):
        bpy.utils.unregister_class(cls)
 
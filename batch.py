@@ -0,0 +1,137 @@
+# Generates a structure without the UI, for running many assets in background blender processes:
+#
+#   blender -b --python path/to/structura/batch.py -- --blend in.blend --config config.json --output out.blend
+#
+# The config is a JSON object, all keys are optional:
+#   {
+#       "structure": {"mode": "EXACT", "overlap_margin": 0.002, ...},   settings of STRA_PGT_Structure
+#       "joint": {"type": "FIXED", "break_threshold": 500, ...},         settings of STRA_PGT_Joint
+#       "collection": "Fractured",    only use mesh objects of this collection
+#       "objects": ["Cube", ...],     or only these objects
+#       "output": "out.blend"
+#   }
+# Without "collection" and "objects" every mesh with a rigid body in the scene is used.
+# With a "shard" entry the script runs as a worker of the "Generate in background processes"
+# operator: it only writes the contacts of the pairs it owns to shard["output"].
+# Progress and stats are written as JSON lines to --log, by default <name>_structure.jsonl next to
+# the output or input file. Not stdout, blender and the generation print plain text there.
+
+import bpy
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+
+def get_package():
+    # import the addon this file belongs to, no matter what its folder is called
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(package_dir))
+    package = importlib.import_module(os.path.basename(package_dir))
+
+    if not hasattr(bpy.types.Scene, 'stra_props_structure'):
+        package.register()
+
+    return package
+
+
+def parse_args(argv):
+    argv = argv[argv.index('--') + 1:] if '--' in argv else []
+
+    parser = argparse.ArgumentParser(prog='batch.py')
+    parser.add_argument('--blend', help='.blend file to open, defaults to the file blender was started with')
+    parser.add_argument('--config', help='JSON file with the settings')
+    parser.add_argument('--output', help='where to save the result, defaults to <name>_structure.blend')
+    parser.add_argument('--log', help='JSON lines progress file, defaults to <name>_structure.jsonl')
+    return parser.parse_args(argv)
+
+
+def apply_settings(props, settings):
+    for key, value in settings.items():
+        if key not in props.bl_rna.properties:
+            raise KeyError(f'unknown setting {key}')
+        setattr(props, key, value)
+
+
+def get_objects(scene, config):
+    if 'objects' in config:
+        objects = [bpy.data.objects[name] for name in config['objects']]
+    elif 'collection' in config:
+        objects = list(bpy.data.collections[config['collection']].all_objects)
+    else:
+        objects = [ob for ob in scene.objects if ob.rigid_body is not None]
+
+    return [ob for ob in objects if ob.type == 'MESH']
+
+
+def log_path(args):
+    if args.log:
+        return args.log
+    name = args.output or args.blend or bpy.data.filepath
+    if not name:
+        return 'structure.jsonl'
+    return os.path.splitext(os.path.abspath(name))[0].removesuffix('_structure') + '_structure.jsonl'
+
+
+def main():
+    args = parse_args(sys.argv)
+
+    log_file = open(log_path(args), 'w')
+    start = time.time()
+
+    def write(event, **data):
+        data['event'] = event
+        data['time'] = time.time() - start
+        log_file.write(json.dumps(data) + '\n')
+        log_file.flush()
+
+    try:
+        if args.blend:
+            bpy.ops.wm.open_mainfile(filepath=os.path.abspath(args.blend))
+
+        package = get_package()
+
+        config = {}
+        if args.config:
+            with open(args.config) as f:
+                config = json.load(f)
+
+        scene = bpy.context.scene
+        apply_settings(scene.stra_props_structure, config.get('structure', {}))
+        apply_settings(scene.stra_props_joint, config.get('joint', {}))
+
+        objects = get_objects(scene, config)
+        write('start', file=bpy.data.filepath, objects=len(objects))
+
+        shard = config.get('shard')
+        if shard is not None:
+            contacts = package.ops_structure.run_shard_worker(scene, objects, shard, on_event=write)
+            write('shard', contacts=len(contacts), file=shard['output'])
+            return
+
+        package.ops_structure.generate_structure(
+            scene, objects, scene.stra_props_structure, scene.stra_props_joint, on_event=write)
+
+        output = args.output or config.get('output')
+        if not output:
+            output = os.path.splitext(bpy.data.filepath)[0] + '_structure.blend'
+        output = os.path.abspath(output)
+
+        bpy.ops.wm.save_as_mainfile(filepath=output)
+        write('saved', file=output)
+    except Exception as e:
+        write('error', message=f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        log_file.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,130 @@
+# Benchmark suite for structure generation. Every case runs in its own background blender process:
+#
+#   python benchmarks/run.py --blender /path/to/blender --output results.json
+#   python benchmarks/run.py --blender blender --baseline benchmarks/baseline.json    compare, exit 1 on regressions
+#   python benchmarks/run.py --blender blender --update-baseline benchmarks/baseline.json
+#
+# A case is one scene type and size, generated in one mode with one existing joint behaviour.
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENES = ['cube_grid', 'stacked_bricks', 'voronoi_slab']
+SIZES = [100, 1000, 10000]
+MODES = ['FAST', 'EXACT']
+BEHAVIOURS = ['NEWONLY', 'OVERWRITE', 'INCREMENTAL', 'NOCHECK']
+
+RUN_CASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_case.py')
+
+
+def case_key(case):
+    return f"{case['scene']}-{case['size']}-{case['mode']}-{case['behaviour']}"
+
+
+def run_case(blender, scene, size, mode, behaviour, settings, timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'case.json')
+        cmd = [blender, '-b', '--factory-startup', '--python', RUN_CASE, '--',
+               '--scene', scene, '--size', str(size), '--mode', mode,
+               '--behaviour', behaviour, '--settings', json.dumps(settings), '--output', output]
+
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        if proc.returncode != 0 or not os.path.exists(output):
+            tail = proc.stdout.decode(errors='replace')[-2000:]
+            return {'scene': scene, 'size': size, 'mode': mode, 'behaviour': behaviour, 'error': tail}
+
+        with open(output) as f:
+            return json.load(f)
+
+
+def compare(results, baseline, time_threshold, memory_threshold, min_seconds):
+    base_cases = {case_key(case): case for case in baseline['cases'] if 'error' not in case}
+
+    regressions = []
+    for case in results['cases']:
+        key = case_key(case)
+        if 'error' in case:
+            regressions.append(f'{key}: failed')
+            continue
+
+        base = base_cases.get(key)
+        if base is None:
+            continue
+
+        if case['wall'] > base['wall'] * (1 + time_threshold) and case['wall'] - base['wall'] > min_seconds:
+            regressions.append(f"{key}: wall time {base['wall']:.2f}s -> {case['wall']:.2f}s")
+
+        if case['peak_memory_mb'] and base['peak_memory_mb']:
+            if case['peak_memory_mb'] > base['peak_memory_mb'] * (1 + memory_threshold):
+                regressions.append(f"{key}: peak memory {base['peak_memory_mb']:.0f}MB -> {case['peak_memory_mb']:.0f}MB")
+
+        if case['joints'] != base['joints']:
+            print(f"(note) {key}: joint count changed {base['joints']} -> {case['joints']}")
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='run.py')
+    parser.add_argument('--blender', default='blender', help='blender executable')
+    parser.add_argument('--scenes', nargs='+', default=SCENES, choices=SCENES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--behaviours', nargs='+', default=BEHAVIOURS, choices=BEHAVIOURS)
+    parser.add_argument('--settings', default='{}', help='extra STRA_PGT_Structure settings as JSON, used for every case')
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds per case')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--update-baseline', metavar='PATH', help='write the results as the new baseline')
+    parser.add_argument('--time-threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='allowed relative peak memory increase')
+    parser.add_argument('--min-seconds', type=float, default=0.1, help='ignore slowdowns smaller than this')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    settings = json.loads(args.settings)
+
+    results = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'settings': settings, 'cases': []}
+
+    matrix = list(itertools.product(args.scenes, args.sizes, args.modes, args.behaviours))
+    for n, (scene, size, mode, behaviour) in enumerate(matrix):
+        print(f'[{n + 1}/{len(matrix)}] {scene} {size} {mode} {behaviour}', flush=True)
+        case = run_case(args.blender, scene, size, mode, behaviour, settings, args.timeout)
+        results['cases'].append(case)
+
+        if 'error' in case:
+            print(f'    failed:\n{case["error"]}')
+        else:
+            print(f"    {case['wall']:.2f}s, {case['joints']} joints, peak {case['peak_memory_mb'] or 0:.0f}MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+
+    if args.update_baseline:
+        with open(args.update_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'baseline written to {args.update_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.time_threshold, args.memory_threshold, args.min_seconds)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Runs a single benchmark case inside blender, started by run.py:
+#
+#   blender -b --factory-startup --python benchmarks/run_case.py -- --scene cube_grid --size 100 \
+#       --mode FAST --behaviour NEWONLY --output case.json
+
+import bpy
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import scenes
+
+
+def get_package():
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(package_dir))
+    package = importlib.import_module(os.path.basename(package_dir))
+
+    if not hasattr(bpy.types.Scene, 'stra_props_structure'):
+        package.register()
+
+    return package
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def parse_args(argv):
+    argv = argv[argv.index('--') + 1:] if '--' in argv else []
+
+    parser = argparse.ArgumentParser(prog='run_case.py')
+    parser.add_argument('--scene', required=True, choices=sorted(scenes.BUILDERS))
+    parser.add_argument('--size', required=True, type=int)
+    parser.add_argument('--mode', required=True, choices=['FAST', 'EXACT'])
+    parser.add_argument('--behaviour', required=True)
+    parser.add_argument('--settings', default='{}', help='extra STRA_PGT_Structure settings as JSON')
+    parser.add_argument('--output', required=True)
+    return parser.parse_args(argv)
+
+
+def run(package, objects, props, props_const):
+    start = time.perf_counter()
+    stats = package.ops_structure.generate_structure(bpy.context.scene, objects, props, props_const)
+    stats['wall'] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    args = parse_args(sys.argv)
+    package = get_package()
+
+    start = time.perf_counter()
+    objects = scenes.build(args.scene, args.size)
+    build_time = time.perf_counter() - start
+
+    scene = bpy.context.scene
+    props = scene.stra_props_structure
+    props_const = scene.stra_props_joint
+    props.mode = args.mode
+    for key, value in json.loads(args.settings).items():
+        setattr(props, key, value)
+
+    # the first run creates the structure, the second one shows how
+    # the existing joint behaviour deals with a scene that already has joints
+    props.existing_joint_behaviour = 'NEWONLY'
+    cold = run(package, objects, props, props_const)
+
+    props.existing_joint_behaviour = args.behaviour
+    warm = run(package, objects, props, props_const)
+
+    result = {
+        'scene': args.scene,
+        'size': args.size,
+        'mode': args.mode,
+        'behaviour': args.behaviour,
+        'blender': bpy.app.version_string,
+        'build_time': build_time,
+        'wall': cold['wall'] + warm['wall'],
+        'joints': len(package.utils.get_collection_joints().objects),
+        'peak_memory_mb': peak_memory_mb(),
+        'cold': cold,
+        'warm': warm,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
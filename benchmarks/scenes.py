@@ -0,0 +1,143 @@
+# Synthetic fracture scenes for the benchmarks, every builder is deterministic for a given size
+
+import bpy
+import bmesh
+import math
+import random
+from mathutils import Vector
+
+
+def clear_scene():
+    for ob in list(bpy.data.objects):
+        bpy.data.objects.remove(ob)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+
+def box_mesh(name, size):
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=1.0)
+    bmesh.ops.scale(bm, vec=size, verts=bm.verts)
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+
+def add_object(collection, name, mesh, location):
+    ob = bpy.data.objects.new(name, mesh)
+    ob.location = location
+    collection.objects.link(ob)
+    return ob
+
+
+def grid_dims(count, layers):
+    side = max(1, round(math.sqrt(count / layers)))
+    return side, max(1, math.ceil(count / (side * layers)))
+
+
+def cube_grid(collection, count):
+    # unit cubes touching face to face, in a block 4 cubes high
+    layers = min(4, count)
+    nx, ny = grid_dims(count, layers)
+    objects = []
+    for n in range(count):
+        x = n % nx
+        y = (n // nx) % ny
+        z = n // (nx * ny)
+        mesh = box_mesh(f'cube_{n}', Vector((1, 1, 1)))
+        objects.append(add_object(collection, f'cube_{n}', mesh, (x, y, z)))
+    return objects
+
+
+def stacked_bricks(collection, count):
+    # running bond wall, every other row shifted by half a brick
+    size = Vector((2.0, 1.0, 0.6))
+    per_row = max(1, round(math.sqrt(count * size.z / size.x)))
+    objects = []
+    for n in range(count):
+        row = n // per_row
+        col = n % per_row
+        x = col * size.x + (size.x / 2 if row % 2 else 0.0)
+        z = row * size.z
+        mesh = box_mesh(f'brick_{n}', size)
+        objects.append(add_object(collection, f'brick_{n}', mesh, (x, 0, z)))
+    return objects
+
+
+def voronoi_slab(collection, count, seed=0):
+    # a slab split into 2.5D voronoi cells, one jittered seed per grid cell
+    rng = random.Random(seed)
+    nx, ny = grid_dims(count, 1)
+    height = 0.5
+
+    seeds = {}
+    for n in range(count):
+        i, j = n % nx, n // nx
+        seeds[(i, j)] = Vector((i + rng.uniform(0.1, 0.9), j + rng.uniform(0.1, 0.9), 0.0))
+
+    objects = []
+    for n in range(count):
+        i, j = n % nx, n // nx
+        center = seeds[(i, j)]
+
+        bm = bmesh.new()
+        bmesh.ops.create_cube(bm, size=1.0)
+        bmesh.ops.scale(bm, vec=(3.0, 3.0, height), verts=bm.verts)
+        bmesh.ops.translate(bm, vec=Vector((i + 0.5, j + 0.5, 0.0)), verts=bm.verts)
+
+        # clip to the slab
+        for co, no in (((0, 0, 0), (-1, 0, 0)), ((0, 0, 0), (0, -1, 0)),
+                       ((nx, 0, 0), (1, 0, 0)), ((0, ny, 0), (0, 1, 0))):
+            geom = bm.verts[:] + bm.edges[:] + bm.faces[:]
+            bmesh.ops.bisect_plane(bm, geom=geom, plane_co=co, plane_no=no, clear_outer=True)
+
+        for di in range(-2, 3):
+            for dj in range(-2, 3):
+                other = seeds.get((i + di, j + dj))
+                if other is None or other is center:
+                    continue
+                normal = (other - center).normalized()
+                midpoint = (other + center) / 2
+                geom = bm.verts[:] + bm.edges[:] + bm.faces[:]
+                bmesh.ops.bisect_plane(bm, geom=geom, plane_co=midpoint, plane_no=normal, clear_outer=True)
+
+        bmesh.ops.holes_fill(bm, edges=bm.edges[:], sides=0)
+        bmesh.ops.recalc_face_normals(bm, faces=bm.faces[:])
+
+        # keep the origin at the cell center like a fracture addon would
+        bmesh.ops.translate(bm, vec=-center, verts=bm.verts)
+        mesh = bpy.data.meshes.new(f'cell_{n}')
+        bm.to_mesh(mesh)
+        bm.free()
+
+        objects.append(add_object(collection, f'cell_{n}', mesh, center))
+    return objects
+
+
+BUILDERS = {
+    'cube_grid': cube_grid,
+    'stacked_bricks': stacked_bricks,
+    'voronoi_slab': voronoi_slab,
+}
+
+
+def build(name, count):
+    clear_scene()
+    scene = bpy.context.scene
+
+    collection = bpy.data.collections.new('BENCHMARK')
+    scene.collection.children.link(collection)
+    objects = BUILDERS[name](collection, count)
+
+    if scene.rigidbody_world is None:
+        bpy.ops.rigidbody.world_add()
+
+    names = {ob.name for ob in objects}
+    view_layer = bpy.context.view_layer
+    for ob in view_layer.objects:
+        ob.select_set(ob.name in names)
+    view_layer.objects.active = objects[0]
+    bpy.ops.rigidbody.objects_add()
+
+    return objects
@@ -0,0 +1,97 @@
+import math
+
+
+def aabb_from_points(points, margin=0.0):
+    it = iter(points)
+    first = next(it, None)
+    if first is None:
+        return None
+
+    lo = [first[0], first[1], first[2]]
+    hi = [first[0], first[1], first[2]]
+    for p in it:
+        for k in range(3):
+            if p[k] < lo[k]:
+                lo[k] = p[k]
+            elif p[k] > hi[k]:
+                hi[k] = p[k]
+
+    return (tuple(c - margin for c in lo), tuple(c + margin for c in hi))
+
+
+def aabb_overlap(a, b):
+    (alo, ahi), (blo, bhi) = a, b
+    return (alo[0] <= bhi[0] and blo[0] <= ahi[0] and
+            alo[1] <= bhi[1] and blo[1] <= ahi[1] and
+            alo[2] <= bhi[2] and blo[2] <= ahi[2])
+
+
+def sweep_axis(aabbs):
+    # sweep along the axis where the boxes are spread out the most,
+    # that keeps the active list short
+    best_axis = 0
+    best_spread = -1.0
+    for k in range(3):
+        centers = [lo[k] + hi[k] for lo, hi in aabbs]
+        spread = max(centers) - min(centers)
+        if spread > best_spread:
+            best_axis = k
+            best_spread = spread
+    return best_axis
+
+
+# returns sorted (i, j) index pairs with i < j whose boxes overlap
+def sweep_and_prune(aabbs):
+    if len(aabbs) < 2:
+        return []
+
+    axis = sweep_axis(aabbs)
+    order = sorted(range(len(aabbs)), key=lambda i: aabbs[i][0][axis])
+
+    pairs = []
+    active = []
+    for i in order:
+        lo = aabbs[i][0][axis]
+        active = [j for j in active if aabbs[j][1][axis] >= lo]
+        for j in active:
+            if aabb_overlap(aabbs[i], aabbs[j]):
+                pairs.append((i, j) if i < j else (j, i))
+        active.append(i)
+
+    pairs.sort()
+    return pairs
+
+
+def tile_of(point, tile_size):
+    return tuple(math.floor(c / tile_size) for c in point)
+
+
+# groups pair indices by tile. a pair belongs to the tile that contains the min corner
+# of the intersection of both boxes, so pairs crossing tile borders are handled once
+def tile_pairs(aabbs, pairs, tile_size):
+    tiles = {}
+    for n, (i, j) in enumerate(pairs):
+        corner = [max(aabbs[i][0][k], aabbs[j][0][k]) for k in range(3)]
+        tiles.setdefault(tile_of(corner, tile_size), []).append(n)
+    return [tiles[key] for key in sorted(tiles)]
+
+
+# splits along the widest axis at quantiles of the box centers, so every shard
+# gets about the same number of pieces. returns the axis and a (lo, hi) range per shard
+def shard_ranges(aabbs, count):
+    axis = sweep_axis(aabbs)
+    centers = sorted((lo[axis] + hi[axis]) / 2 for lo, hi in aabbs)
+    cuts = [centers[len(centers) * k // count] for k in range(1, count)]
+    bounds = [-math.inf] + cuts + [math.inf]
+    return axis, [(bounds[k], bounds[k + 1]) for k in range(count)]
+
+
+def in_shard(aabb, axis, lo, hi):
+    return aabb[0][axis] < hi and aabb[1][axis] >= lo
+
+
+# like tile_pairs, a pair belongs to the shard that contains the min corner of the
+# intersection of both boxes. both boxes reach into that shard
+def owns_pair(a, b, axis, lo, hi):
+    corner = max(a[0][axis], b[0][axis])
+    return lo <= corner < hi
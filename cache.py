@@ -0,0 +1,82 @@
+import bpy
+import os
+import sqlite3
+import time
+
+CACHE_SUFFIX = '.stra_cache.sqlite'
+
+
+def get_cache_path():
+    # the cache lives next to the .blend file, unsaved files don't get one
+    if not bpy.data.filepath:
+        return None
+    return os.path.splitext(bpy.data.filepath)[0] + CACHE_SUFFIX
+
+
+class PairCache:
+    # per pair narrow phase results: (touching, volume, location in obj1 local space)
+    # keyed by a hash of both meshes, their relative transform and the settings
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.stamp = time.time()
+
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS pairs ('
+                        'key TEXT PRIMARY KEY, touching INTEGER, volume REAL, '
+                        'x REAL, y REAL, z REAL, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pairs_used ON pairs (used)')
+
+    def get_many(self, keys, chunk=500):
+        found = {}
+        for start in range(0, len(keys), chunk):
+            part = keys[start:start + chunk]
+            rows = self.db.execute(
+                f'SELECT key, touching, volume, x, y, z FROM pairs WHERE key IN ({",".join("?" * len(part))})',
+                part)
+            for key, touching, volume, x, y, z in rows:
+                loc = None if x is None else (x, y, z)
+                found[key] = (bool(touching), volume, loc)
+
+        self.db.executemany('UPDATE pairs SET used = ? WHERE key = ?',
+                            ((self.stamp, key) for key in found))
+        self.db.commit()
+        return found
+
+    def put_many(self, entries):
+        rows = []
+        for key, (touching, volume, loc) in entries.items():
+            x, y, z = (None, None, None) if loc is None else loc
+            rows.append((key, int(touching), volume, x, y, z, self.stamp))
+
+        self.db.executemany('INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self.evict()
+        self.db.commit()
+
+    def evict(self):
+        count = self.db.execute('SELECT COUNT(*) FROM pairs').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self.db.execute('DELETE FROM pairs WHERE key IN '
+                        '(SELECT key FROM pairs ORDER BY used ASC LIMIT ?)',
+                        (count - self.max_entries,))
+
+    def close(self):
+        self.db.close()
+
+
+def open_cache(max_entries):
+    path = get_cache_path()
+    if path is None:
+        print('(cache) save the file first to use the cache')
+        return None
+    return PairCache(path, max_entries)
+
+
+def clear_cache():
+    path = get_cache_path()
+    if path is None or not os.path.exists(path):
+        return False
+    os.remove(path)
+    return True
@@ -0,0 +1,130 @@
+import bpy
+import bmesh
+import numpy as np
+from . import utils, geometry
+
+# low poly stand-ins for high poly pieces. a proxy is parented to its piece without
+# any offset, so its mesh is in the local space of the piece and both share matrix_world
+
+PROXY_PROPERTY = 'stra_collider'
+
+
+def get_proxy(obj):
+    proxy = obj.get(PROXY_PROPERTY)
+    if not isinstance(proxy, bpy.types.Object) or proxy.parent != obj:
+        return None
+    return proxy
+
+
+def collision_object(obj, use_proxies):
+    # the object to read collision geometry from
+    if use_proxies:
+        proxy = get_proxy(obj)
+        if proxy is not None:
+            return proxy
+    return obj
+
+
+def proxy_key(obj, method, ratio):
+    return f'{geometry.mesh_hash(obj.data)}:{method}:{ratio:.4f}'
+
+
+def convex_hull_mesh(obj):
+    co = geometry.mesh_coords(obj.data).reshape(-1, 3)
+
+    bm = bmesh.new()
+    for v in co.tolist():
+        bm.verts.new(v)
+    result = bmesh.ops.convex_hull(bm, input=bm.verts)
+    bmesh.ops.delete(bm, geom=result['geom_interior'] + result['geom_unused'], context='VERTS')
+
+    mesh = bpy.data.meshes.new(f'{obj.name}_{utils.OBJNAME_COLLIDER}')
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+
+def decimated_mesh(obj, ratio):
+    mod = obj.modifiers.new(type='DECIMATE', name='STRA_DECIMATE')
+    mod.decimate_type = 'COLLAPSE'
+    mod.ratio = ratio
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+    mesh.name = f'{obj.name}_{utils.OBJNAME_COLLIDER}'
+    obj.modifiers.remove(mod)
+    return mesh
+
+
+def update_proxy(obj, col, method, ratio):
+    # returns the proxy and whether it had to be (re)built
+    key = proxy_key(obj, method, ratio)
+    proxy = get_proxy(obj)
+    if proxy is not None and proxy.get('stra_source') == key:
+        return proxy, False
+
+    if method == 'HULL':
+        mesh = convex_hull_mesh(obj)
+    else:
+        mesh = decimated_mesh(obj, ratio)
+
+    if proxy is None:
+        proxy = bpy.data.objects.new(f'{obj.name}_{utils.OBJNAME_COLLIDER}', mesh)
+        col.objects.link(proxy)
+        proxy.parent = obj
+        proxy.display_type = 'WIRE'
+        proxy.hide_render = True
+        obj[PROXY_PROPERTY] = proxy
+    else:
+        old = proxy.data
+        proxy.data = mesh
+        if old.users == 0:
+            bpy.data.meshes.remove(old)
+
+    proxy['stra_source'] = key
+    return proxy, True
+
+
+# rigid body shapes the fit may replace, the primitive ones were picked on purpose
+FITTED_SHAPES = {'BOX', 'CONVEX_HULL', 'MESH'}
+
+
+def hull_arrays(co):
+    bm = bmesh.new()
+    for v in co.tolist():
+        bm.verts.new(v)
+    result = bmesh.ops.convex_hull(bm, input=bm.verts)
+    bmesh.ops.delete(bm, geom=result['geom_interior'] + result['geom_unused'], context='VERTS')
+    bmesh.ops.triangulate(bm, faces=bm.faces)
+    bm.verts.index_update()
+
+    verts = np.array([v.co[:] for v in bm.verts], dtype=np.float64).reshape(-1, 3)
+    tris = np.array([[v.index for v in f.verts] for f in bm.faces], dtype=np.int64).reshape(-1, 3)
+    bm.free()
+    return verts, tris
+
+
+def fit_shape(mesh, box_fill, hull_fill):
+    # the cheapest shape that still follows the mesh: BOX if the mesh fills its bounding box,
+    # CONVEX_HULL if it fills its hull, MESH otherwise. also returns a rough narrow phase cost
+    # per shape (features the solver tests against), for the savings estimate
+    verts, _, tris = geometry.mesh_arrays(mesh)
+    costs = {'BOX': 1, 'CONVEX_HULL': len(verts), 'MESH': len(tris)}
+    if len(verts) < 4:
+        return 'MESH', costs
+
+    volume = geometry.closed_volume(verts, tris)
+    hull_verts, hull_tris = hull_arrays(verts)
+    costs['CONVEX_HULL'] = len(hull_verts)
+    if volume is None:
+        # open surfaces have no inside to compare
+        return 'MESH', costs
+
+    box_volume = float(np.prod(verts.max(axis=0) - verts.min(axis=0)))
+    hull_volume = geometry.closed_volume(hull_verts, hull_tris) or 0.0
+
+    if box_volume > 0.0 and volume / box_volume >= box_fill:
+        return 'BOX', costs
+    if hull_volume > 0.0 and volume / hull_volume >= hull_fill:
+        return 'CONVEX_HULL', costs
+    return 'MESH', costs
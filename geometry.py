@@ -0,0 +1,232 @@
+import hashlib
+import numpy as np
+
+# NOTE: keep this module free of bpy/mathutils imports,
+# it is also loaded by worker processes outside of blender
+
+
+def mesh_arrays(mesh):
+    mesh.calc_loop_triangles()
+
+    num_verts = len(mesh.vertices)
+    co = np.empty(num_verts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    normals = np.empty(num_verts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("normal", normals)
+
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+
+    return (co.reshape(-1, 3).astype(np.float64),
+            normals.reshape(-1, 3).astype(np.float64),
+            tris.reshape(-1, 3))
+
+
+def mesh_coords(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return co
+
+
+def mesh_hash(mesh):
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+
+    h = hashlib.sha1(mesh_coords(mesh).tobytes())
+    h.update(tris.tobytes())
+    return h.hexdigest()
+
+
+def fingerprint(co, matrix, *extra):
+    h = hashlib.sha1(np.ascontiguousarray(co).tobytes())
+    h.update(np.array(matrix, dtype=np.float32).tobytes())
+    h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+def transform_points(points, matrix):
+    m = np.array(matrix, dtype=np.float64)
+    return points @ m[:3, :3].T + m[:3, 3]
+
+
+def transform_normals(normals, matrix):
+    m = np.array(matrix, dtype=np.float64)[:3, :3]
+    # inverse transpose, so non-uniform scale doesn't skew the normals
+    normals = normals @ np.linalg.pinv(m)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    return normals / lengths[:, None]
+
+
+def shell(verts, normals, tris, offset):
+    # same idea as bmesh.ops.solidify: keep the original surface
+    # and add a flipped copy pushed along the vertex normals
+    if offset == 0.0:
+        return verts, tris
+
+    outer = verts + normals * offset
+    verts = np.concatenate((verts, outer))
+    tris = np.concatenate((tris, tris[:, ::-1] + len(outer)))
+    return verts, tris
+
+
+def aabb(verts, margin=0.0):
+    lo = verts.min(axis=0) - margin
+    hi = verts.max(axis=0) + margin
+    return (tuple(lo.tolist()), tuple(hi.tolist()))
+
+
+def closed_volume(verts, tris):
+    # volume from signed tetrahedra, None if the mesh is not closed (every edge used by two triangles)
+    if len(tris) == 0:
+        return None
+    edges = np.sort(np.concatenate((tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]])), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    if np.any(counts != 2):
+        return None
+
+    a, b, c = verts[tris[:, 0]], verts[tris[:, 1]], verts[tris[:, 2]]
+    return abs(np.einsum('ij,ij->i', a, np.cross(b, c)).sum()) / 6
+
+
+def inflate(verts, normals, offset):
+    if offset == 0.0:
+        return verts
+    return verts + normals * offset
+
+
+def mesh_edges(tris):
+    edges = np.sort(np.concatenate((tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]])), axis=1)
+    return np.unique(edges, axis=0)
+
+
+def segments_in_box(verts, edges, box):
+    # (start, end) arrays of the edges whose bounds overlap the box
+    lo, hi = box
+    a = verts[edges[:, 0]]
+    b = verts[edges[:, 1]]
+    keep = np.all(np.maximum(a, b) >= lo, axis=1) & np.all(np.minimum(a, b) <= hi, axis=1)
+    return a[keep], b[keep]
+
+
+def segments_within(a1, b1, a2, b2, distance, max_block=4000000):
+    # whether any segment of the first set comes closer than distance to one of the second.
+    # closest points of segment pairs, clamped to the segments (Ericson, Real-Time Collision Detection 5.1.9)
+    if len(a1) == 0 or len(a2) == 0:
+        return False
+
+    d1 = b1 - a1
+    d2 = b2 - a2
+    len1 = np.einsum('ij,ij->i', d1, d1)
+    len2 = np.einsum('ij,ij->i', d2, d2)
+    # degenerate edges are covered by the vertex test
+    keep1 = len1 > 1e-12
+    keep2 = len2 > 1e-12
+    a1, d1, len1 = a1[keep1], d1[keep1], len1[keep1]
+    a2, d2, len2 = a2[keep2], d2[keep2], len2[keep2]
+
+    block = max(1, max_block // max(len(a2), 1))
+    for start in range(0, len(a1), block):
+        end = start + block
+        r = a1[start:end, None] - a2[None]
+        b = d1[start:end] @ d2.T
+        c = np.einsum('ijk,ik->ij', r, d1[start:end])
+        f = np.einsum('ijk,jk->ij', r, d2)
+        e1 = len1[start:end, None]
+        e2 = len2[None]
+
+        denom = e1 * e2 - b * b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.where(denom > 1e-12, np.clip((b * f - c * e2) / denom, 0.0, 1.0), 0.0)
+        t = (b * s + f) / e2
+        s = np.where(t < 0.0, np.clip(-c / e1, 0.0, 1.0), np.where(t > 1.0, np.clip((b - c) / e1, 0.0, 1.0), s))
+        t = np.clip(t, 0.0, 1.0)
+
+        gap = r + s[..., None] * d1[start:end, None] - t[..., None] * d2[None]
+        if np.any(np.einsum('ijk,ijk->ij', gap, gap) <= distance * distance):
+            return True
+    return False
+
+
+def points_inside(xy, zs, verts, tris, max_block=4000000):
+    # ray parity test along +Z for a grid of points given as
+    # columns (xy) and heights (zs), returns a (columns, heights) bool array
+    counts = np.zeros((len(xy), len(zs)), dtype=np.int32)
+    if len(tris) == 0 or len(xy) == 0:
+        return counts.astype(bool)
+
+    tri = verts[tris]
+
+    # only triangles whose footprint covers a column and that reach above the lowest point
+    tri_min = tri.min(axis=1)
+    tri_max = tri.max(axis=1)
+    keep = np.all(tri_max[:, :2] >= xy.min(axis=0), axis=1)
+    keep &= np.all(tri_min[:, :2] <= xy.max(axis=0), axis=1)
+    keep &= tri_max[:, 2] >= zs[0]
+    tri = tri[keep]
+
+    a = tri[:, 0]
+    e1 = tri[:, 1] - a
+    e2 = tri[:, 2] - a
+    denom = e1[:, 0] * e2[:, 1] - e2[:, 0] * e1[:, 1]
+
+    # vertical triangles can't be hit by a vertical ray
+    valid = denom != 0.0
+    a, e1, e2, denom = a[valid], e1[valid], e2[valid], denom[valid]
+
+    block = max(1, max_block // (len(xy) * len(zs)))
+    for start in range(0, len(a), block):
+        end = start + block
+        px = xy[:, 0, None] - a[None, start:end, 0]
+        py = xy[:, 1, None] - a[None, start:end, 1]
+        u = (px * e2[start:end, 1] - e2[start:end, 0] * py) / denom[start:end]
+        v = (e1[start:end, 0] * py - px * e1[start:end, 1]) / denom[start:end]
+        hit = (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0)
+
+        z = a[start:end, 2] + u * e1[start:end, 2] + v * e2[start:end, 2]
+        z = np.where(hit, z, -np.inf)
+
+        counts += np.count_nonzero(z[:, :, None] > zs[None, None, :], axis=1).astype(np.int32)
+
+    return counts % 2 == 1
+
+
+def intersection_volume(verts1, tris1, verts2, tris2, resolution=16):
+    # estimates the volume and centroid of the overlap of two closed meshes
+    # by sampling a grid over the shared bounding box
+    lo = np.maximum(verts1.min(axis=0), verts2.min(axis=0))
+    hi = np.minimum(verts1.max(axis=0), verts2.max(axis=0))
+    size = hi - lo
+    if np.any(size <= 0.0):
+        return 0.0, None
+
+    cell = size / resolution
+    steps = np.arange(resolution) + 0.5
+    # nudge the columns off the grid so rays don't run exactly along mesh edges
+    xs = lo[0] + (steps + 0.0137) * cell[0]
+    ys = lo[1] + (steps - 0.0219) * cell[1]
+    zs = lo[2] + steps * cell[2]
+
+    gx, gy = np.meshgrid(xs, ys, indexing='ij')
+    xy = np.column_stack((gx.ravel(), gy.ravel()))
+
+    inside = points_inside(xy, zs, verts1, tris1)
+    columns = np.flatnonzero(inside.any(axis=1))
+    if len(columns) == 0:
+        return 0.0, None
+
+    # only test the second mesh where the first one has points
+    inside2 = points_inside(xy[columns], zs, verts2, tris2)
+    inside = inside[columns] & inside2
+
+    col_idx, z_idx = np.nonzero(inside)
+    if len(col_idx) == 0:
+        return 0.0, None
+
+    volume = len(col_idx) * float(np.prod(cell))
+
+    points = np.column_stack((xy[columns][col_idx], zs[z_idx]))
+    centroid = points.mean(axis=0)
+
+    return volume, centroid
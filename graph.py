@@ -0,0 +1,264 @@
+import numpy as np
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+# the structure as a graph: pieces are nodes, joints are edges given as an (n, 2) array
+# of node indices. nothing in here needs bpy
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, a):
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def union(self, a, b):
+        # returns False if a and b were already connected
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        self.parent[b] = a
+        return True
+
+
+def cluster_points(points, radius):
+    # labels points that are chained together by distances below radius, using a
+    # spatial hash with cells of radius size so only neighbouring cells are compared
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if radius <= 0.0 or len(points) == 0:
+        return np.arange(len(points))
+
+    cells = {}
+    for k, cell in enumerate(map(tuple, np.floor(points / radius).astype(np.int64).tolist())):
+        cells.setdefault(cell, []).append(k)
+
+    offsets = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+    radius_sq = radius * radius
+    clusters = UnionFind(len(points))
+    for (cx, cy, cz), members in cells.items():
+        for dx, dy, dz in offsets:
+            others = cells.get((cx + dx, cy + dy, cz + dz))
+            if others is None:
+                continue
+            a = np.array(members)
+            b = np.array(others)
+            dist_sq = ((points[a][:, None, :] - points[b][None, :, :]) ** 2).sum(axis=2)
+            for i, j in zip(*np.nonzero(dist_sq < radius_sq)):
+                clusters.union(a[i], b[j])
+
+    return np.array([clusters.find(k) for k in range(len(points))])
+
+
+def spanning_forest(edges, weights, num_nodes):
+    # mask of the edges in a maximum spanning forest (kruskal, heaviest edges first)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    mask = np.zeros(len(edges), dtype=bool)
+    forest = UnionFind(num_nodes)
+    for k in np.argsort(-np.asarray(weights, dtype=np.float64), kind='stable').tolist():
+        a, b = edges[k]
+        mask[k] = forest.union(a, b)
+    return mask
+
+
+def count_components(edges, num_nodes):
+    components = UnionFind(num_nodes)
+    count = num_nodes
+    for a, b in np.asarray(edges, dtype=np.int64).reshape(-1, 2).tolist():
+        if components.union(a, b):
+            count -= 1
+    return count
+
+
+def merge_plan(edges, locations, weights, num_nodes, radius, max_degree=0):
+    # returns target, for every edge the edge it gets merged into (itself when it's kept).
+    # edges of the maximum spanning forest are always kept, so every island stays connected.
+    # other edges are merged into the nearest kept edge of their spatial cluster that shares a
+    # node with them, or of their nodes when one of them already has max_degree kept edges.
+    # either way the target holds one of the same nodes, so it's in the same island
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    target = np.arange(len(edges))
+    if len(edges) == 0:
+        return target
+
+    labels = cluster_points(locations, radius)
+    required = spanning_forest(edges, weights, num_nodes)
+    order = np.argsort(-np.asarray(weights, dtype=np.float64), kind='stable').tolist()
+
+    degree = np.zeros(num_nodes, dtype=np.int64)
+    cluster_kept = {}
+    node_kept = {}
+
+    def keep(k):
+        a, b = edges[k]
+        degree[a] += 1
+        degree[b] += 1
+        cluster_kept.setdefault(labels[k], []).append(k)
+        node_kept.setdefault(a, []).append(k)
+        node_kept.setdefault(b, []).append(k)
+
+    def nearest(candidates, k):
+        candidates = np.array(candidates)
+        dist_sq = ((locations[candidates] - locations[k]) ** 2).sum(axis=1)
+        return candidates[np.argmin(dist_sq)]
+
+    for k in order:
+        if required[k]:
+            keep(k)
+
+    for k in order:
+        if required[k]:
+            continue
+
+        # both nodes are connected through the forest already, so this edge is redundant
+        a, b = edges[k]
+        kept = [c for c in cluster_kept.get(labels[k], []) if a in edges[c] or b in edges[c]]
+        if kept:
+            target[k] = nearest(kept, k)
+        elif max_degree > 0 and (degree[a] >= max_degree or degree[b] >= max_degree):
+            target[k] = nearest(node_kept.get(a, []) + node_kept.get(b, []), k)
+        else:
+            keep(k)
+
+    return target
+
+
+def prune_plan(edges, weights, num_nodes, extra_per_node):
+    # mask of the edges to keep: the maximum spanning forest plus the heaviest other
+    # edges, as long as both of their nodes have less than extra_per_node extra edges
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    keep = spanning_forest(edges, weights, num_nodes)
+    if extra_per_node <= 0:
+        return keep
+
+    extra = np.zeros(num_nodes, dtype=np.int64)
+    for k in np.argsort(-np.asarray(weights, dtype=np.float64), kind='stable').tolist():
+        if keep[k]:
+            continue
+        a, b = edges[k]
+        if extra[a] < extra_per_node and extra[b] < extra_per_node:
+            keep[k] = True
+            extra[a] += 1
+            extra[b] += 1
+    return keep
+
+
+class Adjacency:
+    # compressed rows: the neighbours of node k are nodes[offsets[k]:offsets[k + 1]],
+    # connected by the edges with the same positions in edge_ids
+    def __init__(self, edges, num_nodes):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        src = np.concatenate((edges[:, 0], edges[:, 1]))
+        dst = np.concatenate((edges[:, 1], edges[:, 0]))
+        ids = np.concatenate((np.arange(len(edges)), np.arange(len(edges))))
+
+        order = np.argsort(src, kind='stable')
+        self.nodes = dst[order]
+        self.edge_ids = ids[order]
+        self.offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=self.offsets[1:])
+
+    def degrees(self):
+        return np.diff(self.offsets)
+
+    def neighbour_slots(self, nodes):
+        # positions in self.nodes / self.edge_ids of all neighbours of nodes
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = self.offsets[nodes]
+        counts = self.offsets[nodes + 1] - starts
+        shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return np.arange(counts.sum()) + shift
+
+    def k_hop(self, seeds, hops):
+        # mask of the nodes at most hops joints away from the seeds
+        visited = np.zeros(len(self.offsets) - 1, dtype=bool)
+        frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+        visited[frontier] = True
+        for _ in range(hops):
+            if len(frontier) == 0:
+                break
+            reached = self.nodes[self.neighbour_slots(frontier)]
+            frontier = np.unique(reached[~visited[reached]])
+            visited[frontier] = True
+        return visited
+
+
+def component_labels(edges, num_nodes):
+    components = UnionFind(num_nodes)
+    for a, b in np.asarray(edges, dtype=np.int64).reshape(-1, 2).tolist():
+        components.union(a, b)
+    return np.array([components.find(k) for k in range(num_nodes)], dtype=np.int64)
+
+
+def laplacian_product(edges, weights, x, num_nodes):
+    flow = weights * (x[edges[:, 0]] - x[edges[:, 1]])
+    return (np.bincount(edges[:, 0], flow, num_nodes) -
+            np.bincount(edges[:, 1], flow, num_nodes))
+
+
+def conjugate_gradient(product, b, diagonal, tol=1e-8, max_iter=None):
+    # jacobi preconditioned, for symmetric positive definite systems
+    max_iter = max_iter or 10 * len(b)
+    x = np.zeros_like(b)
+    r = b.copy()
+    z = r / diagonal
+    p = z.copy()
+    rz = r @ z
+    limit = tol * np.linalg.norm(b)
+    for _ in range(max_iter):
+        if np.linalg.norm(r) <= limit:
+            break
+        q = product(p)
+        alpha = rz / (p @ q)
+        x += alpha * p
+        r -= alpha * q
+        z = r / diagonal
+        rz_next = r @ z
+        p = z + (rz_next / rz) * p
+        rz = rz_next
+    return x
+
+
+def load_paths(edges, stiffness, loads, supports):
+    # static load flow: every node puts its load into the graph, supports take it out.
+    # solves the weighted laplacian L p = loads with p = 0 at the supports, the load
+    # carried by an edge is stiffness * (p[a] - p[b]). returns the absolute edge loads
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    stiffness = np.asarray(stiffness, dtype=np.float64)
+    loads = np.asarray(loads, dtype=np.float64)
+    num_nodes = len(loads)
+
+    diagonal = (np.bincount(edges[:, 0], stiffness, num_nodes) +
+                np.bincount(edges[:, 1], stiffness, num_nodes))
+    # nodes without edges can't pass anything on
+    fixed = np.asarray(supports, dtype=bool) | (diagonal == 0.0)
+    free = np.flatnonzero(~fixed)
+
+    potential = np.zeros(num_nodes)
+    if len(free) > 0:
+        if scipy is not None:
+            rows = np.concatenate((edges[:, 0], edges[:, 1], edges[:, 0], edges[:, 1]))
+            cols = np.concatenate((edges[:, 1], edges[:, 0], edges[:, 0], edges[:, 1]))
+            values = np.concatenate((-stiffness, -stiffness, stiffness, stiffness))
+            laplacian = scipy.sparse.csr_matrix((values, (rows, cols)), shape=(num_nodes, num_nodes))
+            reduced = laplacian[free][:, free].tocsc()
+            potential[free] = scipy.sparse.linalg.spsolve(reduced, loads[free])
+        else:
+            def product(x):
+                full = np.zeros(num_nodes)
+                full[free] = x
+                return laplacian_product(edges, stiffness, full, num_nodes)[free]
+
+            potential[free] = conjugate_gradient(product, loads[free], diagonal[free])
+
+    return np.abs(stiffness * (potential[edges[:, 0]] - potential[edges[:, 1]]))
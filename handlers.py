@@ -0,0 +1,117 @@
+import bpy
+from bpy.app.handlers import persistent
+from . import utils, structure_graph
+
+# names of rigid bodies that were moved or edited since they were last generated
+dirty_objects = set()
+
+# names of objects whose fingerprint was checked since the file was loaded,
+# anything else has to be checked again
+tracked_objects = set()
+
+# counts of the selected objects for the sidebar panels, so drawing doesn't loop over
+# the selection. selecting objects also sends a depsgraph update, which clears it
+_selection_stats = None
+
+
+class SelectionStats:
+    __slots__ = ('view_layer', 'meshes', 'pieces', 'all_rigid_body', 'joints')
+
+    def __init__(self, view_layer, selected_objects):
+        self.view_layer = view_layer.as_pointer()
+        self.meshes = 0
+        self.pieces = 0
+        self.all_rigid_body = True
+
+        joints = set()
+        for ob in selected_objects:
+            if ob.rigid_body is None:
+                self.all_rigid_body = False
+            if ob.type != 'MESH':
+                continue
+            self.meshes += 1
+            if utils.OBJNAME_COLLIDER not in ob.name:
+                self.pieces += 1
+            names = ob.get("joints")
+            if names:
+                joints.update(names)
+        self.joints = len(joints)
+
+
+def selection_stats(context):
+    global _selection_stats
+    stats = _selection_stats
+    if stats is None or stats.view_layer != context.view_layer.as_pointer():
+        stats = _selection_stats = SelectionStats(context.view_layer, context.selected_objects)
+    return stats
+
+
+def invalidate_selection_stats():
+    # for changes that don't go through the depsgraph, like the "joints" properties
+    global _selection_stats
+    _selection_stats = None
+
+
+def structure_changed():
+    invalidate_selection_stats()
+    structure_graph.invalidate()
+
+
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    invalidate_selection_stats()
+    # joints were linked, unlinked or deleted
+    if depsgraph.id_type_updated('COLLECTION'):
+        structure_graph.invalidate()
+
+    for update in depsgraph.updates:
+        ob = update.id
+        if not isinstance(ob, bpy.types.Object):
+            continue
+
+        moved = update.is_updated_transform or update.is_updated_geometry
+        # the index has names, constraint objects and thresholds of the joints: any edit of a
+        # joint, or a rename of a piece (an update without a transform or geometry change)
+        if ob.rigid_body_constraint is not None or (ob.rigid_body is not None and not moved):
+            structure_graph.invalidate()
+
+        if not moved or ob.rigid_body is None:
+            continue
+
+        dirty_objects.add(ob.original.name)
+
+
+@persistent
+def on_load(*args):
+    dirty_objects.clear()
+    tracked_objects.clear()
+    structure_changed()
+
+
+@persistent
+def on_undo_redo(*args):
+    structure_changed()
+
+
+def mark_clean(objects):
+    for ob in objects:
+        dirty_objects.discard(ob.name)
+        tracked_objects.add(ob.name)
+
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    bpy.app.handlers.load_post.append(on_load)
+    bpy.app.handlers.undo_post.append(on_undo_redo)
+    bpy.app.handlers.redo_post.append(on_undo_redo)
+
+
+def unregister():
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load)
+    if on_undo_redo in bpy.app.handlers.undo_post:
+        bpy.app.handlers.undo_post.remove(on_undo_redo)
+    if on_undo_redo in bpy.app.handlers.redo_post:
+        bpy.app.handlers.redo_post.remove(on_undo_redo)
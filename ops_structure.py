@@ -5,73 +5,392 @@ import bmesh
 import math
 from mathutils.bvhtree import BVHTree
 from mathutils import Vector
-from . import utils
+import numpy as np
+from . import utils, broadphase, geometry, parallel, handlers, cache, profiling, graph, colliders, sharding
+import hashlib
+import json
+import shutil
+import tempfile
 import time
 
-def modify_const(ob, props):
+def constraint_values(props):
+    # every constraint setting except the breaking threshold, which depends on the joint
+    ang_max = math.radians(props.leeway_angular)
+    lin_max = props.leeway_linear
+
+    values = {
+        'type': props.type,
+        'disable_collisions': not props.use_local_collisions,
+        'use_breaking': True,
+    }
+    for axis in 'xyz':
+        values[f'use_limit_ang_{axis}'] = True
+        values[f'limit_ang_{axis}_lower'] = -ang_max
+        values[f'limit_ang_{axis}_upper'] = ang_max
+    for axis in 'xyz':
+        values[f'use_limit_lin_{axis}'] = True
+        values[f'limit_lin_{axis}_lower'] = -lin_max
+        values[f'limit_lin_{axis}_upper'] = lin_max
+    return values
+
+
+def differs(current, value):
+    # constraint floats are single precision
+    if isinstance(value, float):
+        return abs(current - value) > 1e-6 * max(1.0, abs(value))
+    return current != value
+
+
+def apply_const_values(ob, values, props):
+    # only writes the settings that differ, returns the number of written settings
     rbc = ob.rigid_body_constraint
-    rbc.type = props.type
-    rbc.disable_collisions = not props.use_local_collisions
-    rbc.use_breaking = True
-    rbc.breaking_threshold = props.break_threshold
+    written = 0
+    for key, value in values.items():
+        if differs(getattr(rbc, key), value):
+            setattr(rbc, key, value)
+            written += 1
 
+    threshold = props.break_threshold
     if props.use_overlap_volume:
-        rbc.breaking_threshold *= ob['intersection_volume']
+        threshold *= ob['intersection_volume']
+    if differs(rbc.breaking_threshold, threshold):
+        rbc.breaking_threshold = threshold
+        written += 1
+
+    return written
 
-    ang_max = math.radians(props.leeway_angular)
-    lin_max = props.leeway_linear
 
-    rbc.use_limit_ang_x = True
-    rbc.limit_ang_x_lower = -ang_max
-    rbc.limit_ang_x_upper = ang_max
-    rbc.use_limit_ang_y = True
-    rbc.limit_ang_y_lower = -ang_max
-    rbc.limit_ang_y_upper = ang_max
-    rbc.use_limit_ang_z = True
-    rbc.limit_ang_z_lower = -ang_max
-    rbc.limit_ang_z_upper = ang_max
-
-    rbc.use_limit_lin_x = True
-    rbc.limit_lin_x_lower = -lin_max
-    rbc.limit_lin_x_upper = lin_max
-    rbc.use_limit_lin_y = True
-    rbc.limit_lin_y_lower = -lin_max
-    rbc.limit_lin_y_upper = lin_max
-    rbc.use_limit_lin_z = True
-    rbc.limit_lin_z_lower = -lin_max
-    rbc.limit_lin_z_upper = lin_max
-
-
-def get_bvh(objects, overlap_margin):
-    trees = []
+def modify_const(ob, props):
+    apply_const_values(ob, constraint_values(props), props)
+
+
+class Piece:
+    __slots__ = ('obj', 'tree', 'aabb', 'verts', 'normals', 'tris', 'mesh', 'shape', 'matrix')
+
+    def __init__(self, obj, tree, aabb, verts, normals=None, tris=None, mesh=None, shape=None, matrix=None):
+        self.obj = obj
+        self.tree = tree
+        self.aabb = aabb
+        self.verts = verts
+        self.normals = normals
+        self.tris = tris
+        # the mesh the geometry comes from, obj.data or the mesh of its proxy collider
+        self.mesh = obj.data if mesh is None else mesh
+        # for linked duplicates: a Shape shared with the other users of the mesh, the tree is
+        # in its local space and matrix (numpy, without scale) goes from there to world space
+        self.shape = shape
+        self.matrix = matrix
+
+
+class Shape:
+    __slots__ = ('tree', 'verts', 'tris', 'aabb')
+
+    def __init__(self, tree, verts, tris, aabb):
+        self.tree = tree
+        self.verts = verts
+        self.tris = tris
+        self.aabb = aabb
+
+
+def build_shape(mesh, scale, overlap_margin, solidify):
+    # same geometry as bvh_from_arrays, but scaled instead of moved to world space
+    verts, normals, tris = geometry.mesh_arrays(mesh)
+    if len(verts) == 0:
+        return None
+
+    verts = verts * np.array(scale)
+    normals = geometry.transform_normals(normals, np.diag(list(scale) + [1.0]))
+    if solidify and overlap_margin != 0.0:
+        verts, tris = geometry.shell(verts, normals, tris, overlap_margin / 4)
+
+    tree = BVHTree.FromPolygons(verts.tolist(), tris.tolist(), all_triangles=True)
+    return Shape(tree, verts, tris, geometry.aabb(verts, overlap_margin))
+
+
+class ShapeCache:
+    # builds one local space tree per mesh and scale that more than one piece uses
+    def __init__(self, objects, props):
+        self.overlap_margin = props.overlap_margin
+        self.solidify = props.margin_mode == 'SOLIDIFY'
+        self.use_proxies = props.use_proxies
+        self.shapes = {}
+
+        users = {}
+        for obj in objects:
+            if is_piece(obj):
+                ptr = colliders.collision_object(obj, self.use_proxies).data.as_pointer()
+                users[ptr] = users.get(ptr, 0) + 1
+        self.shared = {ptr for ptr, count in users.items() if count > 1}
+
+    def piece(self, obj, mesh):
+        # a piece using a shared shape, or None if the mesh has only one user
+        if mesh.as_pointer() not in self.shared:
+            return None
+
+        loc, rot, scale = obj.matrix_world.decompose()
+        key = (mesh.as_pointer(), tuple(round(c, 5) for c in scale))
+        if key not in self.shapes:
+            with profiling.span('bvh_build'):
+                self.shapes[key] = build_shape(mesh, scale, self.overlap_margin, self.solidify)
+        shape = self.shapes[key]
+        if shape is None:
+            return None
+
+        matrix = np.array(rot.to_matrix().to_4x4())
+        matrix[:3, 3] = loc
+        lo, hi = shape.aabb
+        corners = np.array([(x, y, z) for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+        aabb = geometry.aabb(geometry.transform_points(corners, matrix))
+
+        return Piece(obj, shape.tree, aabb, None, mesh=mesh, shape=shape, matrix=matrix)
+
+
+def bvh_from_bmesh(obj, overlap_margin, solidify, mesh=None):
+    mesh = obj.data if mesh is None else mesh
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+
+    if len(bm.verts) == 0:
+        bm.free()
+        return None
+
+    bmesh.ops.transform(bm, matrix=obj.matrix_world, verts=bm.verts)
+    verts = np.array([v.co[:] for v in bm.verts], dtype=np.float64)
+
+    if solidify and overlap_margin != 0.0:
+        bmesh.ops.solidify(bm, geom=bm.faces, thickness=-overlap_margin / 4)
+
+    bm.verts.ensure_lookup_table()
+    bm.edges.ensure_lookup_table()
+    bm.faces.ensure_lookup_table()
+
+    tree = BVHTree.FromBMesh(bm)
+    aabb = broadphase.aabb_from_points((v.co for v in bm.verts), overlap_margin)
+
+    bm.free()
+
+    return Piece(obj, tree, aabb, verts, mesh=mesh)
+
+
+def bvh_from_arrays(obj, overlap_margin, solidify, mesh=None):
+    mesh = obj.data if mesh is None else mesh
+    verts, normals, tris = geometry.mesh_arrays(mesh)
+
+    if len(verts) == 0:
+        return None
+
+    verts = geometry.transform_points(verts, obj.matrix_world)
+    normals = geometry.transform_normals(normals, obj.matrix_world)
+    tree_verts, tree_tris = verts, tris
+
+    if solidify and overlap_margin != 0.0:
+        tree_verts, tree_tris = geometry.shell(verts, normals, tris, overlap_margin / 4)
+
+    tree = BVHTree.FromPolygons(tree_verts.tolist(), tree_tris.tolist(), all_triangles=True)
+    aabb = geometry.aabb(tree_verts, overlap_margin)
+
+    return Piece(obj, tree, aabb, verts, normals, tris, mesh)
+
+
+def is_piece(obj):
+    return obj.type == 'MESH' and utils.OBJNAME_COLLIDER not in obj.name
+
+
+def iter_bvh(objects, overlap_margin, vectorized, margin_mode, pieces, use_proxies=False, shapes=None):
+    # appends to pieces, yields after every object
+    build = bvh_from_arrays if vectorized else bvh_from_bmesh
+    solidify = margin_mode == 'SOLIDIFY'
+
     for obj in objects:
-        if obj.type != 'MESH':
+        yield
+        if not is_piece(obj):
             continue
-        if utils.OBJNAME_COLLIDER in obj.name:
+
+        mesh = colliders.collision_object(obj, use_proxies).data
+        piece = None if shapes is None else shapes.piece(obj, mesh)
+        if piece is None:
+            with profiling.span('bvh_build'):
+                piece = build(obj, overlap_margin, solidify, mesh)
+        if piece is None:
+            print('todo remove empty mesh objects')
             continue
 
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
+        pieces.append(piece)
 
-        if len(bm.verts) == 0:
+
+def lazy_pieces(objects, overlap_margin, use_proxies=False):
+    # trees are built on demand by ensure_tree, boxes come from the bounding box
+    pieces = []
+    for obj in objects:
+        if not is_piece(obj):
+            continue
+        if len(obj.data.vertices) == 0:
             print('todo remove empty mesh objects')
             continue
 
-        bmesh.ops.transform(bm, matrix=obj.matrix_world, verts=bm.verts)
+        mesh = colliders.collision_object(obj, use_proxies).data
+        pieces.append(Piece(obj, None, bound_box_aabb(obj, overlap_margin), None, mesh=mesh))
 
-        if overlap_margin != 0.0:
-            bmesh.ops.solidify(bm, geom=bm.faces, thickness=-overlap_margin / 4)
+    return pieces
 
-        bm.verts.ensure_lookup_table()
-        bm.edges.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
 
-        tree = BVHTree.FromBMesh(bm)
-        trees.append((tree, (obj, bm)))
+def ensure_tree(piece, props, shapes=None):
+    if piece.tree is not None:
+        return
+
+    shared = None if shapes is None else shapes.piece(piece.obj, piece.mesh)
+    if shared is not None:
+        piece.tree = shared.tree
+        piece.shape = shared.shape
+        piece.matrix = shared.matrix
+        return
+
+    build = bvh_from_arrays if props.use_vectorized_bvh else bvh_from_bmesh
+    with profiling.span('bvh_build'):
+        built = build(piece.obj, props.overlap_margin, props.margin_mode == 'SOLIDIFY', piece.mesh)
+
+    piece.tree = built.tree
+    piece.verts = built.verts
+    piece.normals = built.normals
+    piece.tris = built.tris
+
+
+def release_piece(piece):
+    piece.tree = None
+    piece.shape = None
+    piece.matrix = None
+    piece.verts = None
+    piece.normals = None
+    piece.tris = None
+
+
+def ensure_piece_arrays(piece):
+    if piece.tris is not None and piece.normals is not None:
+        return
+
+    verts, normals, tris = geometry.mesh_arrays(piece.mesh)
+    piece.verts = geometry.transform_points(verts, piece.obj.matrix_world)
+    piece.normals = geometry.transform_normals(normals, piece.obj.matrix_world)
+    piece.tris = tris
+
+
+def sampled_intersection(piece1, piece2, overlap_margin, resolution):
+    ensure_piece_arrays(piece1)
+    ensure_piece_arrays(piece2)
+
+    # same as the boolean path: only the first object is grown by the margin
+    with profiling.span('volume'):
+        verts1 = geometry.inflate(piece1.verts, piece1.normals, overlap_margin)
+        return geometry.intersection_volume(verts1, piece1.tris, piece2.verts, piece2.tris, resolution)
+
+
+def pieces_within(piece1, piece2, distance):
+    for a, b in ((piece1, piece2), (piece2, piece1)):
+        # only vertices inside the other piece's (margin inflated) box can be close enough
+        lo, hi = b.aabb
+        candidates = a.verts[np.all((a.verts >= lo) & (a.verts <= hi), axis=1)]
+        for co in candidates.tolist():
+            if b.tree.find_nearest(co, distance)[0] is not None:
+                return True
+
+    # two edges can pass closer than any vertex comes to the other surface,
+    # like boxes crossing edge on edge
+    ensure_piece_arrays(piece1)
+    ensure_piece_arrays(piece2)
+    near1 = near_segments(piece1.verts, piece1.tris, piece2.aabb, piece2.tree, distance)
+    if len(near1[0]) == 0:
+        return False
+    near2 = near_segments(piece2.verts, piece2.tris, piece1.aabb, piece1.tree, distance)
+    return edges_within(near1, near2, distance)
+
+
+def near_segments(verts, tris, box, tree, distance):
+    # (start, end) arrays of the edges that can come within distance of the tree's surface,
+    # verts in the space of the tree. the midpoint of such an edge is at most distance plus
+    # half its length away, so the pairwise test only gets a few edges around the contact
+    a, b = geometry.segments_in_box(verts, geometry.mesh_edges(tris), box)
+    reach = distance + np.linalg.norm(b - a, axis=1) / 2
+    keep = np.array([tree.find_nearest(co, r)[0] is not None
+                     for co, r in zip(((a + b) / 2).tolist(), reach.tolist())], dtype=bool)
+    return a[keep], b[keep]
+
+
+def edges_within(segments1, segments2, distance):
+    # both sets of (start, end) arrays in the same space
+    with profiling.span('edge_distance'):
+        return geometry.segments_within(*segments1, *segments2, distance)
+
+
+def host_box(piece):
+    # bounds of the piece in the space of its tree
+    return piece.aabb if piece.shape is None else piece.shape.aabb
+
+
+def within_box(points, box):
+    lo, hi = box
+    return points[np.all((points >= lo) & (points <= hi), axis=1)]
+
+
+def shapes_touch(piece1, piece2, overlap_margin, margin_mode):
+    # at least one piece has a shared local space tree. the geometry of one piece (the guest,
+    # always one with a shape) is moved into the tree space of the other (the host), and only
+    # its triangles inside the host's box get a temporary tree for the overlap test
+    if piece1.shape is None or (piece2.shape is not None and len(piece2.shape.tris) < len(piece1.shape.tris)):
+        host, guest = piece1, piece2
+    else:
+        host, guest = piece2, piece1
+
+    to_host = guest.matrix if host.shape is None else np.linalg.inv(host.matrix) @ guest.matrix
+    verts = geometry.transform_points(guest.shape.verts, to_host)
+
+    lo, hi = host_box(host)
+    tri_verts = verts[guest.shape.tris]
+    inside = np.all(tri_verts.max(axis=1) >= lo, axis=1) & np.all(tri_verts.min(axis=1) <= hi, axis=1)
+    if inside.any():
+        used, remap = np.unique(guest.shape.tris[inside], return_inverse=True)
+        temp = BVHTree.FromPolygons(verts[used].tolist(), remap.reshape(-1, 3).tolist(), all_triangles=True)
+        if host.tree.overlap(temp):
+            return True
+
+    if margin_mode == 'DISTANCE' and overlap_margin != 0.0:
+        distance = overlap_margin / 2
+        for co in within_box(verts, host_box(host)).tolist():
+            if host.tree.find_nearest(co, distance)[0] is not None:
+                return True
+
+        host_verts = host.verts if host.shape is None else host.shape.verts
+        host_tris = host.tris if host.shape is None else host.shape.tris
+        to_guest = np.linalg.inv(to_host)
+        for co in within_box(geometry.transform_points(host_verts, to_guest), guest.shape.aabb).tolist():
+            if guest.tree.find_nearest(co, distance)[0] is not None:
+                return True
+
+        # each side is filtered against the other's tree in that tree's space,
+        # the host edges are moved back for the pairwise test
+        guest_edges = near_segments(verts, guest.shape.tris, host_box(host), host.tree, distance)
+        if len(guest_edges[0]):
+            a, b = near_segments(geometry.transform_points(host_verts, to_guest), host_tris,
+                                 guest.shape.aabb, guest.tree, distance)
+            host_edges = (geometry.transform_points(a, to_host), geometry.transform_points(b, to_host))
+            if edges_within(guest_edges, host_edges, distance):
+                return True
+
+    return False
 
-        bm.free()
 
-    return trees
+def pieces_touch(piece1, piece2, overlap_margin, margin_mode):
+    if piece1.shape is not None or piece2.shape is not None:
+        return shapes_touch(piece1, piece2, overlap_margin, margin_mode)
+
+    if piece1.tree.overlap(piece2.tree):
+        return True
+
+    if margin_mode == 'DISTANCE' and overlap_margin != 0.0:
+        # solidify grows both pieces by a quarter of the margin, so vertex to surface
+        # and edge to edge distances below half the margin find the same contacts
+        return pieces_within(piece1, piece2, overlap_margin / 2)
+
+    return False
 
 
 def get_joints_by_rb(obj_rb, col_joints):
@@ -90,20 +409,17 @@ def get_joints_by_rb(obj_rb, col_joints):
     return joint_objs
 
 
-def store_joint_reference(obj1, joint):
-    if "joints" in obj1:
-        joints = obj1["joints"]
-        if isinstance(joints, list):
-            if joint.name not in joints:
-                joints.append(joint.name)
-        else:
-            joints = [joint.name]
+def store_joint_references(obj1, names):
+    joints = obj1.get("joints")
+    if isinstance(joints, list):
+        existing = set(joints)
+        joints.extend(name for name in names if name not in existing)
     else:
-        joints = [joint.name]
+        joints = list(names)
     obj1["joints"] = joints
 
 
-def create_joint(col_joints, obj1, obj2, loc, volume):
+def create_joint_template(col_joints, props):
     if len(col_joints.objects) == 0:
         empty = bpy.data.objects.new(utils.OBJNAME_JOINT, None)
         col_joints.objects.link(empty)
@@ -114,48 +430,351 @@ def create_joint(col_joints, obj1, obj2, loc, volume):
         empty = original.copy()
         col_joints.objects.link(empty)
 
-    empty.location = loc
-
-    empty.rigid_body_constraint.object1 = obj1
-    empty.rigid_body_constraint.object2 = obj2
-
     empty.empty_display_size = 0.1
     empty.empty_display_type = 'ARROWS'
+    empty.show_in_front = True
 
-    empty['intersection_volume'] = volume
-
-    store_joint_reference(obj1, empty)
-    store_joint_reference(obj2, empty)
+    empty['intersection_volume'] = 1.0
+    modify_const(empty, props)
 
     return empty
 
 
+def create_joints(col_joints, contacts, props):
+    # contacts is a list of (obj1, obj2, loc, volume), every joint is a copy of one
+    # configured template and the "joints" properties are written once per object
+    joints = []
+    if not contacts:
+        return joints
+
+    template = create_joint_template(col_joints, props)
+
+    new_names = {}
+    for obj1, obj2, loc, volume in contacts:
+        if joints:
+            empty = template.copy()
+            col_joints.objects.link(empty)
+        else:
+            empty = template
+
+        empty.location = loc
+
+        rbc = empty.rigid_body_constraint
+        rbc.object1 = obj1
+        rbc.object2 = obj2
+
+        empty['intersection_volume'] = volume
+        if props.use_overlap_volume:
+            rbc.breaking_threshold = props.break_threshold * volume
+
+        new_names.setdefault(obj1, []).append(empty.name)
+        new_names.setdefault(obj2, []).append(empty.name)
+        joints.append(empty)
+
+    for obj, names in new_names.items():
+        store_joint_references(obj, names)
+    handlers.structure_changed()
+
+    return joints
+
+
+def unlink_joint(joint):
+    rbc = joint.rigid_body_constraint
+    profiling.log(f'removing joint between {rbc.object1.name} and {rbc.object2.name}')
+
+    utils.remove_joint_from_property(rbc.object1, joint.name)
+    utils.remove_joint_from_property(rbc.object2, joint.name)
+
+    for col in joint.users_collection:
+        col.objects.unlink(joint)
+
+
+def remove_joints(joints):
+    # bulk version of unlink_joint, every "joints" property is written once
+    names_by_obj = {}
+    for joint in joints:
+        rbc = joint.rigid_body_constraint
+        for obj in (rbc.object1, rbc.object2):
+            if obj is not None:
+                names_by_obj.setdefault(obj, set()).add(joint.name)
+
+        for col in joint.users_collection:
+            col.objects.unlink(joint)
+
+    for obj, names in names_by_obj.items():
+        utils.remove_joints_from_property(obj, names)
+    handlers.structure_changed()
+
+
+def collect_joints(objects, col_joints):
+    # every joint of the objects once, in a stable order
+    joints = {}
+    for obj in objects:
+        if obj.rigid_body is None:
+            continue
+        for joint in get_joints_by_rb(obj, col_joints):
+            joints[joint.name] = joint
+    return list(joints.values())
+
+
+def joint_graph(joints):
+    # edges between piece indices for joints that connect two objects
+    pieces = {}
+    edges = []
+    used = []
+    for joint in joints:
+        rbc = joint.rigid_body_constraint
+        if rbc is None or rbc.object1 is None or rbc.object2 is None:
+            continue
+        edges.append((pieces.setdefault(rbc.object1, len(pieces)),
+                      pieces.setdefault(rbc.object2, len(pieces))))
+        used.append(joint)
+    return used, list(pieces), np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def merge_joints(joints, radius, max_per_piece, props):
+    # merges redundant joints within radius of each other into one, summing their volume.
+    # returns the number of removed joints
+    joints, pieces, edges = joint_graph(joints)
+    if len(joints) == 0:
+        return 0
+
+    locations = np.array([joint.location for joint in joints], dtype=np.float64)
+    volumes = np.array([joint['intersection_volume'] for joint in joints], dtype=np.float64)
+
+    with profiling.span('merge_plan'):
+        target = graph.merge_plan(edges, locations, volumes, len(pieces), radius, max_per_piece)
+    merged_volumes = np.bincount(target, weights=volumes, minlength=len(joints))
+
+    removed = []
+    for k, joint in enumerate(joints):
+        if target[k] != k:
+            removed.append(joint)
+        elif merged_volumes[k] != volumes[k]:
+            joint['intersection_volume'] = float(merged_volumes[k])
+            if props.use_overlap_volume:
+                joint.rigid_body_constraint.breaking_threshold = props.break_threshold * merged_volumes[k]
+
+    remove_joints(removed)
+    return len(removed)
+
+
+def prune_joints(joints, extra_per_piece):
+    # keeps the strongest joints that hold every island together plus up to extra_per_piece
+    # more per piece. returns (removed joints, components before, components after)
+    joints, pieces, edges = joint_graph(joints)
+    volumes = np.array([joint['intersection_volume'] for joint in joints], dtype=np.float64)
+
+    keep = graph.prune_plan(edges, volumes, len(pieces), extra_per_piece)
+    components_before = graph.count_components(edges, len(pieces))
+    components_after = graph.count_components(edges[keep], len(pieces))
+
+    remove_joints([joint for joint, kept in zip(joints, keep) if not kept])
+    return int((~keep).sum()), components_before, components_after
+
+
+def resting_loads(joints, pieces, edges, gravity):
+    # force each joint carries when the structure rests under gravity. passive rigid bodies
+    # are the supports, an island without one rests on its lowest piece
+    masses = np.array([obj.rigid_body.mass if obj.rigid_body is not None else 0.0 for obj in pieces])
+    supports = np.array([obj.rigid_body is None or obj.rigid_body.type == 'PASSIVE' for obj in pieces],
+                        dtype=bool)
+
+    labels = graph.component_labels(edges, len(pieces))
+    heights = np.array([obj.matrix_world.translation.z for obj in pieces])
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        if not supports[members].any():
+            supports[members[np.argmin(heights[members])]] = True
+
+    volumes = np.array([joint['intersection_volume'] for joint in joints], dtype=np.float64)
+    stiffness = np.maximum(volumes, 1e-9)
+    with profiling.span('load_paths'):
+        loads = graph.load_paths(edges, stiffness, masses * gravity, supports)
+
+    # a joint has to hold at least the lighter of its two pieces
+    lighter = np.minimum(masses[edges[:, 0]], masses[edges[:, 1]]) * gravity
+    return np.maximum(loads, lighter)
+
+
 def remove_existing_joints(col_joints, obj1, obj2):
     num_existing_joints = 0
     existing_joints = get_joints_by_rb(obj1, col_joints)
     for ex_joint in existing_joints:
         rbc = ex_joint.rigid_body_constraint
         if rbc.object1 == obj2 or rbc.object2 == obj2:
-            print(f'removing joint between {rbc.object1.name} and {rbc.object2.name}')
-
-            utils.remove_joint_from_property(rbc.object1, ex_joint.name)
-            utils.remove_joint_from_property(rbc.object2, ex_joint.name)
-
-            for col in ex_joint.users_collection:
-                col.objects.unlink(ex_joint)
+            unlink_joint(ex_joint)
             num_existing_joints += 1
 
     return num_existing_joints
 
 
-def joint_exists(col_joints, obj1, obj2):
-    existing_joints = get_joints_by_rb(obj1, col_joints)
-    for ex_joint in existing_joints:
-        rbc = ex_joint.rigid_body_constraint
-        if rbc.object1 == obj2 or rbc.object2 == obj2:
-            return True
+def contact_counts(contacts):
+    # number of contacts per object name, from (obj1, obj2, ...) tuples
+    counts = {}
+    for obj1, obj2, *_ in contacts:
+        counts[obj1.name] = counts.get(obj1.name, 0) + 1
+        counts[obj2.name] = counts.get(obj2.name, 0) + 1
+    return counts
 
-    return False
+
+def assign_collision_shapes(objects, contacts, props):
+    # sets the cheapest adequate collision shape on the rigid bodies of the pieces.
+    # the cost of a shape counts once per contact of its piece, since that's how often the
+    # solver runs the narrow phase on it. returns (changed, cost before, cost after)
+    fits = {}
+    changed = 0
+    cost_before = 0
+    cost_after = 0
+    for obj in objects:
+        rb = obj.rigid_body
+        if not is_piece(obj) or rb is None or rb.collision_shape not in colliders.FITTED_SHAPES:
+            continue
+
+        # linked duplicates are fitted once
+        key = obj.data.as_pointer()
+        if key not in fits:
+            fits[key] = colliders.fit_shape(obj.data, props.shape_box_fill, props.shape_hull_fill)
+        shape, costs = fits[key]
+
+        weight = max(contacts.get(obj.name, 0), 1)
+        cost_before += costs[rb.collision_shape] * weight
+        cost_after += costs[shape] * weight
+        if rb.collision_shape != shape:
+            rb.collision_shape = shape
+            changed += 1
+
+    return changed, cost_before, cost_after
+
+
+def shapes_result(changed, cost_before, cost_after):
+    result = f'collision shapes of {changed} piece(s) changed'
+    if cost_before:
+        result += f', estimated contact cost {100 * (cost_after - cost_before) / cost_before:+.0f}%'
+    return result
+
+
+def object_fingerprint(obj, overlap_margin):
+    co = geometry.mesh_coords(obj.data)
+    return geometry.fingerprint(co, obj.matrix_world, overlap_margin)
+
+
+def store_fingerprints(objects, overlap_margin):
+    for obj in objects:
+        obj["stra_fingerprint"] = object_fingerprint(obj, overlap_margin)
+    handlers.mark_clean(objects)
+
+
+def find_dirty_objects(objects, overlap_margin):
+    dirty = []
+    for obj in objects:
+        # untouched since the last check, no need to hash it again
+        if (obj.name in handlers.tracked_objects and obj.name not in handlers.dirty_objects
+                and "stra_fingerprint" in obj):
+            continue
+        if obj.get("stra_fingerprint") != object_fingerprint(obj, overlap_margin):
+            dirty.append(obj)
+        else:
+            handlers.mark_clean([obj])
+    return dirty
+
+
+def bound_box_aabb(obj, margin):
+    mat = obj.matrix_world
+    return broadphase.aabb_from_points((mat @ Vector(corner) for corner in obj.bound_box), margin)
+
+
+def shard_aabb(obj, props):
+    # the box a piece is sharded by. the coordinator and the workers have to use the same one,
+    # the tree boxes differ by solidify shell and margin mode. touching pieces are less than
+    # half the margin apart, so their boxes always overlap
+    return bound_box_aabb(colliders.collision_object(obj, props.use_proxies), props.overlap_margin)
+
+
+def incremental_objects(objects, overlap_margin, col_joints):
+    # returns the changed objects, the objects that have to be rebuilt
+    # (changed ones and their neighbours) and the amount of removed joints
+    pieces = [obj for obj in objects if is_piece(obj)]
+    dirty = set(find_dirty_objects(pieces, overlap_margin))
+    if not dirty:
+        return dirty, [], 0
+
+    pairs = broadphase.sweep_and_prune([bound_box_aabb(obj, overlap_margin) for obj in pieces])
+    involved = set(dirty)
+    for i, j in pairs:
+        if pieces[i] in dirty or pieces[j] in dirty:
+            involved.add(pieces[i])
+            involved.add(pieces[j])
+
+    # joints of changed objects are recalculated, as long as both ends are selected
+    selected = set(pieces)
+    num_removed = 0
+    for obj in dirty:
+        for joint in get_joints_by_rb(obj, col_joints):
+            rbc = joint.rigid_body_constraint
+            other = rbc.object2 if rbc.object1 == obj else rbc.object1
+            if other in selected:
+                num_removed += remove_existing_joints(col_joints, obj, other)
+
+    return dirty, [obj for obj in pieces if obj in involved], num_removed
+
+
+def cache_settings(props):
+    # everything besides the two meshes that changes the narrow phase result
+    return (round(props.overlap_margin, 6), props.margin_mode, props.use_vectorized_bvh,
+            props.exact_method, props.sample_resolution, props.use_proxies)
+
+
+def pair_cache_key(piece1, piece2, settings, mesh_hashes):
+    obj1 = piece1.obj
+    obj2 = piece2.obj
+    for mesh in (piece1.mesh, piece2.mesh):
+        ptr = mesh.as_pointer()
+        if ptr not in mesh_hashes:
+            mesh_hashes[ptr] = geometry.mesh_hash(mesh)
+
+    mat1 = obj1.matrix_world
+    # adding 0.0 turns -0.0 into 0.0 so both hash the same
+    relative = np.round(np.array(mat1.inverted_safe() @ obj2.matrix_world), 5) + 0.0
+    scale = np.round(np.array(mat1.to_scale()), 5) + 0.0
+
+    h = hashlib.sha1(mesh_hashes[piece1.mesh.as_pointer()].encode())
+    h.update(mesh_hashes[piece2.mesh.as_pointer()].encode())
+    h.update(relative.tobytes())
+    h.update(scale.tobytes())
+    h.update(repr(settings).encode())
+    return h.hexdigest()
+
+
+def pair_key(obj1, obj2):
+    a = obj1.as_pointer()
+    b = obj2.as_pointer()
+    return (a, b) if a < b else (b, a)
+
+
+class JointRegistry:
+    # all joints of the joints collection, keyed by their unordered object pair
+
+    def __init__(self, col_joints):
+        self.joints = {}
+
+        for joint in col_joints.objects:
+            self.add(joint)
+
+    def add(self, joint):
+        rbc = joint.rigid_body_constraint
+        if rbc is None or rbc.object1 is None or rbc.object2 is None:
+            return
+        self.joints.setdefault(pair_key(rbc.object1, rbc.object2), []).append(joint)
+
+    def exists(self, obj1, obj2):
+        return pair_key(obj1, obj2) in self.joints
+
+    def remove(self, obj1, obj2):
+        joints = self.joints.pop(pair_key(obj1, obj2), [])
+        for joint in joints:
+            unlink_joint(joint)
+        return len(joints)
 
 
 class STRA_OT_Modify_Structure(Operator):
@@ -170,19 +789,94 @@ class STRA_OT_Modify_Structure(Operator):
         bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
 
         col_joints = utils.get_collection_joints()
+        joints = collect_joints(context.selected_objects, col_joints)
+
+        values = constraint_values(props)
+        changed = 0
+        for joint in joints:
+            if apply_const_values(joint, values, props):
+                changed += 1
+        if changed:
+            handlers.structure_changed()
+
+        self.report({'INFO'}, f'Changed {changed} of {len(joints)} joint(s)')
+        return {'FINISHED'}
+
+
+class STRA_OT_Merge_Joints(Operator):
+    bl_idname = "stra.structure_merge_joints"
+    bl_label = "Merge joints"
+    bl_description = "Merge redundant joints of the selected objects that are close to each other into one. Pieces stay connected"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        props = context.scene.stra_props_structure
+        props_const = context.scene.stra_props_joint
+
+        col_joints = utils.get_collection_joints()
+        joints = collect_joints(context.selected_objects, col_joints)
+        removed = merge_joints(joints, props.merge_radius, props.max_joints_per_piece, props_const)
+
+        self.report({'INFO'}, f'Merged {removed} of {len(joints)} joint(s), {len(joints) - removed} left')
+        return {'FINISHED'}
+
+
+class STRA_OT_Prune_Structure(Operator):
+    bl_idname = "stra.structure_prune"
+    bl_label = "Prune joints"
+    bl_description = "Remove joints of the selected objects that are not needed to hold the structure together. Keeps the joints with the biggest overlap volume"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        props = context.scene.stra_props_structure
+
+        col_joints = utils.get_collection_joints()
+        joints = collect_joints(context.selected_objects, col_joints)
+        removed, before, after = prune_joints(joints, props.prune_extra_joints)
+
+        result = f'Removed {removed} of {len(joints)} joint(s)'
+        result += f', {before} connected component(s) before, {after} after'
+        self.report({'INFO'}, result)
+        return {'FINISHED'}
 
-        already_applied = []
-        for ob in context.selected_objects:
-            if ob.rigid_body is None:
-                continue
-            joints = get_joints_by_rb(ob, col_joints)
-            for ob in joints:
-                if ob in already_applied:
-                    continue
-                already_applied.append(ob)
-                modify_const(ob, props)
 
-        self.report({'INFO'}, f'Applied for {len(already_applied)} joint(s)')
+class STRA_OT_Analyze_Structure(Operator):
+    bl_idname = "stra.structure_analyze"
+    bl_label = "Set thresholds from loads"
+    bl_description = "Estimate the load on every joint of the selected objects when the structure rests under gravity, and set the breaking thresholds to the safety factor times that load"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.stra_props_structure
+
+        col_joints = utils.get_collection_joints()
+        joints, pieces, edges = joint_graph(collect_joints(context.selected_objects, col_joints))
+        if len(joints) == 0:
+            self.report({'INFO'}, 'No joints found')
+            return {'CANCELLED'}
+
+        gravity = scene.gravity.length if scene.use_gravity else 9.81
+        loads = resting_loads(joints, pieces, edges, gravity)
+
+        # breaking thresholds are impulses, a force over one simulation step
+        world = scene.rigidbody_world
+        substeps = world.substeps_per_frame if world is not None else 10
+        dt = scene.render.fps_base / (scene.render.fps * substeps)
+        thresholds = (props.analysis_safety * dt) * loads
+
+        changed = 0
+        for joint, threshold in zip(joints, thresholds.tolist()):
+            rbc = joint.rigid_body_constraint
+            if differs(rbc.breaking_threshold, threshold):
+                rbc.breaking_threshold = threshold
+                changed += 1
+        if changed:
+            handlers.structure_changed()
+
+        solver = 'scipy' if graph.scipy is not None else 'numpy'
+        self.report({'INFO'}, f'Changed {changed} of {len(joints)} threshold(s), '
+                              f'highest load {loads.max():.1f}N ({solver})')
         return {'FINISHED'}
 
 
@@ -200,127 +894,676 @@ def create_intersection_mesh(obj1, obj2, solidify_thickness):
     col_temp = utils.get_collection_temp()
     col_temp.objects.link(temp_obj)
 
-    bpy.context.view_layer.objects.active = temp_obj
-
     bool_mod = temp_obj.modifiers.new(type="BOOLEAN", name="bool")
     bool_mod.solver = 'EXACT' # FAST causes bad volumes
     bool_mod.operation = 'INTERSECT'
     bool_mod.object = obj2
-    bpy.ops.object.modifier_apply(modifier=bool_mod.name)
+
+    # apply through the depsgraph instead of modifier_apply,
+    # that needs an active object and doesn't work well in background mode
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    result = bpy.data.meshes.new_from_object(temp_obj.evaluated_get(depsgraph))
+    temp_obj.modifiers.remove(bool_mod)
+    temp_obj.data = result
 
     return temp_obj
 
 
-class STRA_OT_Generate_Structure(Operator):
-    bl_idname = "stra.structure_generate"
-    bl_label = "Generate structure"
-    bl_options = {"UNDO_GROUPED"}
+def contact_from_intersection(volume, centroid, min_overlap_threshold):
+    if centroid is None:
+        profiling.log(f'(skip) intersection has no volume')
+        return None
 
-    def execute(self, context):
-        bpy.context.scene.frame_current = 0
+    if volume < min_overlap_threshold:
+        profiling.log('(skip) intersection volume too small')
+        return None
 
-        if context.scene.rigidbody_world is None:
-            bpy.ops.rigidbody.world_add()
+    return Vector(centroid), volume
 
-        props = context.scene.stra_props_structure
-        props_const = context.scene.stra_props_joint
 
-        col_joints = utils.get_collection_joints()
+def boolean_intersection(obj1, obj2, overlap_margin):
+    with profiling.span('boolean'):
+        intersect_obj = create_intersection_mesh(
+            obj1, obj2, overlap_margin)
 
-        bpy.context.scene.frame_current = 0
-        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+    if len(intersect_obj.data.vertices) == 0:
+        bpy.data.objects.remove(intersect_obj)
+        return 0.0, None
 
-        print('creating bvh trees...')
-        trees = get_bvh(context.selected_objects, props.overlap_margin)
+    with profiling.span('volume'):
+        bm = bmesh.new()
+        bm.from_mesh(intersect_obj.data)
+        volume = bm.calc_volume()
+        bm.free()
 
-        num_existing_joints = 0
+        loc = Vector((0, 0, 0))
+        for v in intersect_obj.data.vertices:
+            loc += v.co
+        loc /= len(intersect_obj.data.vertices)
 
-        if props.existing_joint_behaviour == 'OVERWRITE':
-            print(f'overwrite on, removing existing joints...')
-            for obj1 in context.selected_objects:
-                for obj2 in context.selected_objects:
-                    if obj1 == obj2:
-                        continue
-                    num_existing_joints += remove_existing_joints(col_joints, obj1, obj2)
-            print(f'done removing {num_existing_joints} joints')
+        loc = intersect_obj.matrix_world @ loc
 
-        joints_generated_amount = 0
-        joints_already_exist = 0
+    bpy.data.objects.remove(intersect_obj)
 
-        start_time = time.time()
+    return volume, loc
 
-        for i in range(len(trees)):
-            for j in range(i + 1, len(trees)):
-                tree1, (obj1, bm1) = trees[i]
-                tree2, (obj2, bm2) = trees[j]
 
-                overlap_pairs = tree1.overlap(tree2)
-                if not overlap_pairs:
-                    continue
+def parallel_intersections(pieces, contacts, props, control, pool):
+    # only export the pieces that take part in a contact
+    used = {k for pair in contacts for k in pair}
+    arrays = []
+    for k, piece in enumerate(pieces):
+        if k in used:
+            ensure_piece_arrays(piece)
+            arrays.append((piece.verts, piece.normals, piece.tris))
+        else:
+            arrays.append(None)
 
-                if props.existing_joint_behaviour == 'NEWONLY':
-                    if (joint_exists(col_joints, obj1, obj2)):
-                        joints_already_exist += 1
-                        print(f'(skip) joint already exists!')
-                        continue
+    print(f'calculating {len(contacts)} intersection(s) on {len(pool.procs)} worker(s)...')
+    # a cancel kills the workers, the pairs they finished are still used
+    steps = pool.iter_run(arrays, contacts, props.overlap_margin, props.sample_resolution,
+                          lambda: control.cancelled)
+    while True:
+        try:
+            with profiling.span('parallel_volume'):
+                done = next(steps)
+        except StopIteration as finished:
+            return finished.value
+        yield done
 
-                print(f' ')
-                print(f'overlap found: ({obj1.name} x {obj2.name})')
 
-                loc = Vector((0, 0, 0))
-                volume = props.overlap_margin
+def iter_generation(scene, objects, props, props_const, profiler, control):
+    # yields the progress between small pieces of work and returns the stats.
+    # once control.cancelled is set, the joints for the contacts found so far are created
+    scene.frame_current = 0
 
-                if props.mode == "EXACT":
-                    intersect_obj = create_intersection_mesh(
-                        obj1, obj2, props.overlap_margin)
+    if scene.rigidbody_world is None:
+        bpy.ops.rigidbody.world_add()
 
-                    if len(intersect_obj.data.vertices) == 0:
-                        print(f'(skip) created intersection has no volume')
-                        bpy.data.objects.remove(intersect_obj)
-                        continue
+    col_joints = utils.get_collection_joints()
 
-                    bm = bmesh.new()
-                    bm.from_mesh(intersect_obj.data)
-                    volume = bm.calc_volume()
-                    bm.free()
+    num_existing_joints = 0
+
+    incremental = props.existing_joint_behaviour == 'INCREMENTAL'
+    if incremental:
+        print('looking for changed objects...')
+        dirty, objects, num_existing_joints = incremental_objects(
+            objects, props.overlap_margin, col_joints)
+        print(f'{len(dirty)} changed object(s), {len(objects)} to recalculate')
+        profiler.end_stage('incremental')
+
+    pair_cache = None
+    if props.use_cache:
+        pair_cache = cache.open_cache(props.cache_max_entries)
+
+    shapes = None
+    if props.use_shared_trees and props.use_vectorized_bvh:
+        shapes = ShapeCache(objects, props)
+
+    print('creating bvh trees...')
+    if pair_cache is None and not props.use_tiles:
+        trees = []
+        for _ in iter_bvh(objects, props.overlap_margin, props.use_vectorized_bvh,
+                          props.margin_mode, trees, props.use_proxies, shapes):
+            yield 0.0
+            if control.cancelled:
+                break
+    else:
+        # trees are only built for pairs that are not cached, or one tile at a time
+        trees = lazy_pieces(objects, props.overlap_margin, props.use_proxies)
+    profiler.end_stage('bvh')
+
+    registry = None
+    if props.existing_joint_behaviour in ('NEWONLY', 'OVERWRITE'):
+        print('indexing existing joints...')
+        registry = JointRegistry(col_joints)
+        profiler.end_stage('index')
+
+    print('finding candidate pairs...')
+    candidate_pairs = broadphase.sweep_and_prune([piece.aabb for piece in trees])
+    num_all_pairs = len(trees) * (len(trees) - 1) // 2
+    if incremental:
+        # pairs of unchanged objects keep their joints
+        candidate_pairs = [(i, j) for i, j in candidate_pairs
+                           if trees[i].obj in dirty or trees[j].obj in dirty]
+    if control.shard is not None:
+        # only the pairs this shard owns, the other workers do the rest. ownership uses the
+        # boxes the coordinator split the pieces by, so the owner has both pieces
+        boxes = [shard_aabb(piece.obj, props) for piece in trees]
+        candidate_pairs = [(i, j) for i, j in candidate_pairs
+                           if broadphase.owns_pair(boxes[i], boxes[j], *control.shard)]
+    num_culled_pairs = num_all_pairs - len(candidate_pairs)
+    print(f'{len(candidate_pairs)} candidate pair(s), {num_culled_pairs} culled')
+    profiler.end_stage('broadphase')
+
+    joints_already_exist = 0
+
+    start_time = time.time()
+
+    keys = [None] * len(candidate_pairs)
+    cached = {}
+    new_entries = {}
+    if pair_cache is not None:
+        settings = cache_settings(props)
+        mesh_hashes = {}
+        keys = [pair_cache_key(trees[i], trees[j], settings, mesh_hashes)
+                for i, j in candidate_pairs]
+        cached = pair_cache.get_many(keys)
+        print(f'{len(cached)} of {len(keys)} pair(s) found in cache')
+
+    # all pairs are one batch, in tiled mode every tile is a batch and the trees
+    # of a tile are released once it's done
+    tiled = props.use_tiles
+    if tiled:
+        batches = broadphase.tile_pairs([piece.aabb for piece in trees], candidate_pairs, props.tile_size)
+        print(f'{len(batches)} tile(s)')
+    else:
+        batches = [range(len(candidate_pairs))]
+
+    exact = props.mode == "EXACT"
+    use_sampled = exact and props.exact_method == 'SAMPLED'
+    num_pairs = len(candidate_pairs)
+
+    def cached_volume(key):
+        entry = cached.get(key)
+        return entry is not None and entry[1] is not None
+
+    # progress counts finished pairs. in exact mode every contact costs an intersection
+    # on top, pairs that weren't checked yet are assumed to be contacts
+    def progress(pairs_done, intersections_done):
+        if not exact:
+            return pairs_done / num_pairs
+        return (pairs_done + intersections_done) / (2 * num_pairs - pairs_done + len(contacts))
+
+    print('checking candidate pairs for contact...')
+    contacts = []
+    accepted = []
+    # touching pairs whose contact was calculated, overwrite replaces their joints
+    processed = []
+    pairs_done = 0
+    for batch_index, batch in enumerate(batches):
+        if control.cancelled:
+            break
+
+        batch_contacts = []
+        batch_keys = []
+        for n in batch:
+            yield progress(pairs_done, len(contacts))
+            if control.cancelled:
+                break
+            pairs_done += 1
+
+            i, j = candidate_pairs[n]
+            key = keys[n]
+            obj1 = trees[i].obj
+            obj2 = trees[j].obj
+
+            entry = cached.get(key)
+            if entry is not None:
+                touching = entry[0]
+                profiler.count('cache hits')
+            else:
+                ensure_tree(trees[i], props, shapes)
+                ensure_tree(trees[j], props, shapes)
+                with profiling.span('overlap'):
+                    touching = pieces_touch(trees[i], trees[j], props.overlap_margin, props.margin_mode)
+                profiler.count('pairs tested')
+                if key is not None:
+                    new_entries[key] = (touching, None, None)
+
+            if not touching:
+                continue
+
+            if props.existing_joint_behaviour == 'NEWONLY':
+                if registry.exists(obj1, obj2):
+                    joints_already_exist += 1
+                    profiling.log(f'(skip) joint already exists!')
+                    continue
 
-                    if volume < props.min_overlap_threshold:
-                        print('(skip) intersection volume too small')
-                        bpy.data.objects.remove(intersect_obj)
-                        continue
+            batch_contacts.append((i, j))
+            batch_keys.append(key)
+
+        profiler.end_stage('contacts')
+
+        contacts_done = len(contacts)
+        contacts.extend(batch_contacts)
+
+        intersections = {}
+        if use_sampled and props.use_parallel and not control.cancelled:
+            pending = [n for n, key in enumerate(batch_keys) if not cached_volume(key)]
+            if control.pool is None and pending:
+                # started once, every tile reuses the same workers
+                control.pool = parallel.WorkerPool(props.worker_count)
+            steps = parallel_intersections(trees, [batch_contacts[n] for n in pending], props, control,
+                                           control.pool)
+            while True:
+                try:
+                    done = next(steps)
+                except StopIteration as finished:
+                    results = finished.value
+                    break
+                yield progress(pairs_done, contacts_done + done * len(pending))
+            # after a cancel only the pairs the workers finished have a result
+            intersections = {n: result for n, result in zip(pending, results) if result is not None}
+
+        num_booleans = 0
+        for n, (i, j) in enumerate(batch_contacts):
+            yield progress(pairs_done, contacts_done + n)
+            # fast contacts, cached volumes and the ones the workers finished cost nothing,
+            # those still become joints after a cancel
+            if control.cancelled and exact and n not in intersections and not cached_volume(batch_keys[n]):
+                continue
 
-                    for v in intersect_obj.data.vertices:
-                        loc += v.co
-                    loc /= len(intersect_obj.data.vertices)
+            obj1 = trees[i].obj
+            obj2 = trees[j].obj
+            key = batch_keys[n]
 
-                    loc = intersect_obj.matrix_world @ loc
+            profiling.log(f' ')
+            profiling.log(f'overlap found: ({obj1.name} x {obj2.name})')
 
-                    bpy.data.objects.remove(intersect_obj)
+            if exact:
+                if cached_volume(key):
+                    volume, local = cached[key][1:]
+                    centroid = None if local is None else obj1.matrix_world @ Vector(local)
                 else:
-                    # midpoint between two objects
-                    loc = (obj1.location + obj2.location) / 2
+                    if n in intersections:
+                        volume, centroid = intersections[n]
+                    elif use_sampled:
+                        volume, centroid = sampled_intersection(
+                            trees[i], trees[j], props.overlap_margin, props.sample_resolution)
+                    else:
+                        volume, centroid = boolean_intersection(
+                            colliders.collision_object(obj1, props.use_proxies),
+                            colliders.collision_object(obj2, props.use_proxies), props.overlap_margin)
+                        num_booleans += 1
+
+                    if key is not None:
+                        # store the location relative to obj1, so it survives moving both objects
+                        local = None
+                        if centroid is not None:
+                            local = tuple(obj1.matrix_world.inverted_safe() @ Vector(centroid))
+                        new_entries[key] = (True, volume, local)
+
+                contact = contact_from_intersection(volume, centroid, props.min_overlap_threshold)
+            else:
+                # midpoint between two objects
+                contact = ((obj1.location + obj2.location) / 2, props.overlap_margin)
+
+            processed.append((obj1, obj2))
+            if contact is not None:
+                loc, volume = contact
+                accepted.append((obj1, obj2, loc, volume))
+                profiling.log(f'(ok) contact found with volume {volume:.2f}')
+
+            # an iteration covers all contacts of the same first object
+            if n + 1 < len(batch_contacts) and batch_contacts[n + 1][0] == i:
+                continue
+
+            profiling.log(f"One iteration done")
+            profiling.log(f"Progress: {props.progress*100:.2f}%")
+
+            if num_booleans > 0:
+                with profiler.span('orphan_purge'):
+                    bpy.ops.outliner.orphans_purge(do_local_ids=True)
+                num_booleans = 0
+
+        profiler.end_stage('intersections')
+
+        if tiled:
+            # keep what the next tile needs, everything else is built again if it comes up later
+            keep = set()
+            if batch_index + 1 < len(batches):
+                keep = {k for n in batches[batch_index + 1] for k in candidate_pairs[n]}
+            for k in {k for n in batch for k in candidate_pairs[n]} - keep:
+                release_piece(trees[k])
+            print(f'tile {batch_index + 1}/{len(batches)} done, {len(batch_contacts)} contact(s)')
+
+    if pair_cache is not None:
+        print(f'(cache) storing {len(new_entries)} new result(s)')
+        pair_cache.put_many(new_entries)
+        pair_cache.close()
+        profiler.end_stage('cache')
+
+    control.close_pool()
+
+    if props.existing_joint_behaviour == 'OVERWRITE':
+        # every touching pair that was calculated, also the ones now below the overlap threshold.
+        # pairs a cancel didn't reach keep their joints
+        for obj1, obj2 in processed:
+            num_existing_joints += registry.remove(obj1, obj2)
+        print(f'done removing {num_existing_joints} joints')
+
+    control.accepted = accepted
+    if control.shard is not None:
+        # the coordinator creates the joints of all shards at once
+        joints = []
+    else:
+        print(f'creating {len(accepted)} joint(s)...')
+        with profiler.span('joint_creation'):
+            joints = create_joints(col_joints, accepted, props_const)
+    if registry is not None:
+        for joint in joints:
+            registry.add(joint)
+
+    num_merged = 0
+    if props.merge_joints and joints:
+        print('merging joints...')
+        with profiler.span('merge'):
+            num_merged = merge_joints(collect_joints([piece.obj for piece in trees], col_joints),
+                                      props.merge_radius, props.max_joints_per_piece, props_const)
+        print(f'{num_merged} joint(s) merged')
+
+    shapes_changed = None
+    if props.use_collision_shapes and control.shard is None:
+        print('fitting collision shapes...')
+        with profiler.span('collision_shapes'):
+            shapes_changed = assign_collision_shapes([piece.obj for piece in trees], contact_counts(accepted), props)
+        print(shapes_result(*shapes_changed))
+
+    if control.cancelled:
+        # not every pair was checked, the next 'Changed only' run has to look at all of them again
+        print('cancelled, kept the joints found so far')
+    elif control.shard is None:
+        store_fingerprints([piece.obj for piece in trees], props.overlap_margin)
+    profiler.end_stage('joints')
+
+    elapsed_time = time.time() - start_time
+    print(f'FINISHED! Overlap calculations took {elapsed_time:.2f} seconds')
+
+    profiler.count('contacts', len(contacts))
+    if shapes is not None:
+        profiler.count('shared trees', len(shapes.shapes))
+    profiler.count('joints created', len(joints))
+
+    return {
+        'objects': len(trees),
+        'all_pairs': num_all_pairs,
+        'candidate_pairs': len(candidate_pairs),
+        'culled_pairs': num_culled_pairs,
+        'contacts': len(contacts),
+        'joints_generated': len(joints),
+        'joints_new': len(joints) - num_existing_joints,
+        'joints_removed': num_existing_joints,
+        'joints_already_exist': joints_already_exist,
+        'joints_merged': num_merged,
+        'shapes_changed': shapes_changed,
+        'tiles': len(batches),
+        'elapsed': elapsed_time,
+        'cancelled': control.cancelled,
+    }
+
+
+class Generation:
+    # runs iter_generation either in one go or in time slices from the modal operator
+    def __init__(self, scene, objects, props, props_const, on_event=None, shard=None):
+        self.props = props
+        # (axis, lo, hi) when this runs as a shard worker
+        self.shard = shard
+        self.accepted = None
+        self.pool = None
+        self.profiler = profiling.Profiler(quiet=props.quiet, trace=bool(props.profile_path), on_event=on_event)
+        self.steps = iter_generation(scene, objects, props, props_const, self.profiler, self)
+        self.cancelled = False
+        self.progress = 0.0
+        self.stats = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def close(self):
+        # stops a generation that won't be stepped again
+        self.steps.close()
+        self.close_pool()
+
+    def set_progress(self, value):
+        # the estimate drops once the number of contacts is known, don't show that
+        if value < self.progress + 0.001:
+            return
+        self.progress = value
+        self.props.progress = value
+        self.profiler.emit('progress', progress=value)
+
+    def step(self, budget=None):
+        # works for about budget seconds, or until the end without one. returns True when finished
+        if self.stats is not None:
+            return True
 
-                joint = create_joint(col_joints, obj1, obj2, loc, volume)
-                modify_const(joint, props_const)
+        deadline = None if budget is None else time.perf_counter() + budget
+        with self.profiler:
+            try:
+                while True:
+                    self.set_progress(next(self.steps))
+                    if deadline is not None and time.perf_counter() > deadline:
+                        return False
+            except StopIteration as finished:
+                self.stats = finished.value
+            except Exception:
+                self.close_pool()
+                raise
+
+        self.set_progress(1.0)
+        print(self.profiler.summary())
+        if self.props.profile_path:
+            path = bpy.path.abspath(self.props.profile_path)
+            self.profiler.write_trace(path)
+            print(f'profile written to {path}')
+
+        self.stats['timings'] = self.profiler.stages
+        self.stats['counters'] = self.profiler.counters
+        self.profiler.emit('finished', **self.stats)
+        return True
+
+
+def run_shard_worker(scene, objects, shard, on_event=None):
+    # runs inside a background worker started by STRA_OT_Generate_Sharded, see batch.py
+    props = scene.stra_props_structure
+    generation = Generation(scene, objects, props, scene.stra_props_joint, on_event,
+                            shard=(shard['axis'], shard['lo'], shard['hi']))
+    generation.step()
+
+    contacts = [(obj1.name, obj2.name, tuple(loc), volume) for obj1, obj2, loc, volume in generation.accepted]
+    with open(shard['output'], 'w') as f:
+        json.dump(contacts, f)
+    return contacts
+
+
+def generate_structure(scene, objects, props, props_const, on_event=None):
+    # does the whole generation without touching the UI, so it also runs with blender -b.
+    # on_event(name, **data) is called with progress and stage timings
+    generation = Generation(scene, objects, props, props_const, on_event)
+    generation.step()
+    return generation.stats
+
+
+class STRA_OT_Generate_Sharded(Operator):
+    bl_idname = "stra.structure_generate_sharded"
+    bl_label = "Generate in background processes"
+    bl_description = "Split the selected objects into shards and generate every shard in its own background blender process"
+    bl_options = {"UNDO"}
 
-                joint.show_in_front = True
+    def execute(self, context):
+        scene = context.scene
+        props = scene.stra_props_structure
+        props_const = scene.stra_props_joint
+
+        if props.existing_joint_behaviour == 'INCREMENTAL':
+            self.report({'ERROR'}, "'Changed only' is not supported in background processes")
+            return {'CANCELLED'}
 
-                joints_generated_amount += 1
-                print(f'(ok) joint created with volume {volume:.2f}')
+        objects = [obj for obj in context.selected_objects if is_piece(obj) and len(obj.data.vertices) > 0]
+        if len(objects) < 2:
+            self.report({'WARNING'}, 'Select at least two mesh objects')
+            return {'CANCELLED'}
 
-            props.progress = (i + 1) / (len(trees))
-            print(f"One iteration done")
-            print(f"Progress: {props.progress*100:.2f}%")
+        if scene.rigidbody_world is None:
+            bpy.ops.rigidbody.world_add()
 
-            if props.mode == "EXACT":
-                bpy.ops.outliner.orphans_purge(do_local_ids=True)
+        start_time = time.time()
+        aabbs = [shard_aabb(obj, props) for obj in objects]
+        count = max(1, min(props.shard_count, len(objects) // 2))
+        axis, ranges = broadphase.shard_ranges(aabbs, count)
+        shards = [([obj.name for obj, aabb in zip(objects, aabbs) if broadphase.in_shard(aabb, axis, lo, hi)],
+                   axis, lo, hi) for lo, hi in ranges]
+
+        wm = context.window_manager
+        tmpdir = tempfile.mkdtemp(prefix='structura_')
+        wm.progress_begin(0, len(shards))
+        try:
+            print(f'generating {len(shards)} shard(s) in background processes...')
+            workers = sharding.launch_workers(shards, tmpdir)
+            sharding.wait_workers(workers, wm.progress_update)
+            results = sharding.merge_results(workers)
+        except RuntimeError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            wm.progress_end()
+            shutil.rmtree(tmpdir, ignore_errors=True)
 
-        result = f"{joints_generated_amount} joint(s) generated"
-        result += f", ({joints_generated_amount - num_existing_joints} new, {joints_already_exist} already exist)"
+        col_joints = utils.get_collection_joints()
+        registry = JointRegistry(col_joints)
+
+        accepted = []
+        num_existing_joints = 0
+        joints_already_exist = 0
+        for name1, name2, loc, volume in results:
+            obj1 = bpy.data.objects.get(name1)
+            obj2 = bpy.data.objects.get(name2)
+            if obj1 is None or obj2 is None:
+                continue
+
+            if props.existing_joint_behaviour == 'NEWONLY':
+                if registry.exists(obj1, obj2):
+                    joints_already_exist += 1
+                    continue
+            elif props.existing_joint_behaviour == 'OVERWRITE':
+                num_existing_joints += registry.remove(obj1, obj2)
+
+            accepted.append((obj1, obj2, Vector(loc), volume))
+
+        joints = create_joints(col_joints, accepted, props_const)
+
+        num_merged = 0
+        if props.merge_joints and joints:
+            num_merged = merge_joints(collect_joints(objects, col_joints),
+                                      props.merge_radius, props.max_joints_per_piece, props_const)
+
+        shapes_changed = None
+        if props.use_collision_shapes:
+            shapes_changed = assign_collision_shapes(objects, contact_counts(accepted), props)
+
+        store_fingerprints(objects, props.overlap_margin)
+
+        result = f"{len(joints)} joint(s) generated in {len(shards)} shard(s)"
+        result += f", ({len(joints) - num_existing_joints} new, {joints_already_exist} already exist)"
+        if num_merged:
+            result += f", {num_merged} merged"
+        if shapes_changed is not None:
+            result += ", " + shapes_result(*shapes_changed)
+        result += f", {time.time() - start_time:.1f}s"
+        self.report({'INFO'}, result)
+        return {'FINISHED'}
+
+
+class STRA_OT_Generate_Structure(Operator):
+    bl_idname = "stra.structure_generate"
+    bl_label = "Generate structure"
+    bl_options = {"UNDO"}
+
+    # events that still reach the viewport while generating
+    NAVIGATION = {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'}
+
+    running = False
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running
+
+    def report_stats(self, stats):
+        result = f"{stats['joints_generated']} joint(s) generated"
+        result += f", ({stats['joints_new']} new, {stats['joints_already_exist']} already exist)"
+        result += f", {stats['culled_pairs']} of {stats['all_pairs']} pair(s) culled"
+        if stats['joints_merged']:
+            result += f", {stats['joints_merged']} merged"
+        if stats['shapes_changed'] is not None:
+            result += ", " + shapes_result(*stats['shapes_changed'])
+        if stats['cancelled']:
+            result = "Cancelled, " + result
         self.report({'INFO'}, result)
 
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        print(f'FINISHED! Overlap calculations took {elapsed_time:.2f} seconds')
+    def execute(self, context):
+        props = context.scene.stra_props_structure
+        props_const = context.scene.stra_props_joint
+
+        bpy.context.scene.frame_current = 0
+        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+
+        stats = generate_structure(context.scene, context.selected_objects, props, props_const)
+        self.report_stats(stats)
+
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        props = context.scene.stra_props_structure
+        props_const = context.scene.stra_props_joint
 
+        self.generation = Generation(context.scene, list(context.selected_objects), props, props_const)
+        self.timer = context.window_manager.event_timer_add(0.01, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        type(self).running = True
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            # finishes right away with the contacts found so far
+            self.generation.cancel()
+            return self.finish(context)
+
+        if event.type == 'TIMER':
+            props = context.scene.stra_props_structure
+            try:
+                done = self.generation.step(props.frame_budget / 1000)
+            except Exception:
+                self.generation.close()
+                self.stop(context)
+                raise
+            if done:
+                return self.finish(context)
+
+            for area in context.screen.areas:
+                area.tag_redraw()
+            return {'RUNNING_MODAL'}
+
+        if event.type in self.NAVIGATION:
+            return {'PASS_THROUGH'}
+
+        # block editing while the objects are in use
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        # blender dropped the handler (file loaded, window closed), the objects may be gone,
+        # closing the generator also stops the worker processes
+        self.generation.close()
+        self.stop(context)
+
+    def stop(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        type(self).running = False
+
+    def finish(self, context):
+        try:
+            self.generation.step()
+        finally:
+            self.stop(context)
+
+        for area in context.screen.areas:
+            area.tag_redraw()
+        self.report_stats(self.generation.stats)
+
+        # finished, also when cancelled, so the joints created so far are one undo step
         return {'FINISHED'}
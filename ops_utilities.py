@@ -1,6 +1,32 @@
 import bpy
+import numpy as np
 from bpy.types import Operator
-from . import utils
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+from . import utils, cache, colliders, handlers, ops_structure, structure_file, structure_graph
+
+
+def select_by_name(context, names):
+    # replaces the selection in one pass, names that are not in the view layer are skipped
+    layer_objects = context.view_layer.objects
+    objects = [ob for ob in map(layer_objects.get, names) if ob is not None]
+
+    for ob in context.selected_objects:
+        ob.select_set(False)
+    for ob in objects:
+        ob.select_set(True)
+    if objects:
+        layer_objects.active = objects[0]
+
+    return len(objects)
+
+
+def select_query_result(context, index, pieces, joints):
+    names = []
+    if pieces is not None:
+        names += [index.piece_names[k] for k in np.flatnonzero(pieces)]
+    if joints is not None:
+        names += [index.joint_names[k] for k in np.flatnonzero(joints)]
+    return select_by_name(context, names)
 
 
 class STRA_OT_Select_Joints(Operator):
@@ -9,30 +35,195 @@ class STRA_OT_Select_Joints(Operator):
     bl_options = {"UNDO_GROUPED"}
 
     def execute(self, context):
+        index = structure_graph.get_index()
+        if index is None:
+            return {'CANCELLED'}
+
+        meshes = [ob for ob in context.selected_objects if ob.type == 'MESH']
+
+        # drop names of joints that were deleted
         col_joints = utils.get_collection_joints()
+        for ob in meshes:
+            stale = [name for name in ob.get("joints", []) if name not in col_joints.objects]
+            if stale:
+                utils.remove_joints_from_property(ob, set(stale))
+                handlers.invalidate_selection_stats()
+
+        pieces, joints = index.joints_of(meshes)
+        select_query_result(context, index, pieces, joints)
+
+        return {'FINISHED'}
+
 
-        joint_objs_to_select = []
+class STRA_OT_Query_Structure(Operator):
+    bl_idname = "stra.utils_query_structure"
+    bl_label = "Select"
+    bl_description = "Select pieces or joints of the structure that match the query"
+    bl_options = {"UNDO_GROUPED"}
+
+    def execute(self, context):
+        props = context.scene.stra_props_structure
 
+        index = structure_graph.get_index()
+        if index is None:
+            self.report({'INFO'}, 'No structure in this scene')
+            return {'CANCELLED'}
+
+        selected = context.selected_objects
+        if props.query == 'NEIGHBOURS':
+            pieces, joints = index.neighbourhood(selected, props.query_hops)
+        elif props.query == 'ISLANDS':
+            pieces, joints = index.islands(selected)
+        elif props.query == 'WEAK':
+            pieces, joints = index.weak_joints(props.query_cutoff, props.query_weak_by == 'VOLUME')
+        else:
+            pieces, joints = index.high_degree(props.query_degree)
+
+        count = select_query_result(context, index, pieces, joints)
+        self.report({'INFO'}, f'{count} object(s) selected')
+        return {'FINISHED'}
+
+
+class STRA_OT_Generate_Colliders(Operator):
+    bl_idname = "stra.utils_generate_colliders"
+    bl_label = "Generate proxy colliders"
+    bl_description = "Create low poly proxies of the selected pieces for overlap detection. Proxies that are up to date are kept"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        props = context.scene.stra_props_structure
+        col = utils.get_collection_colliders()
+
+        built = 0
+        kept = 0
+        tris_before = 0
+        tris_after = 0
         for ob in context.selected_objects:
-            if ob.type != 'MESH':
+            if ob.type != 'MESH' or utils.OBJNAME_COLLIDER in ob.name:
                 continue
-            if not ob.get("joints"):
+
+            proxy, rebuilt = colliders.update_proxy(ob, col, props.proxy_method, props.proxy_ratio)
+            if rebuilt:
+                built += 1
+            else:
+                kept += 1
+
+            ob.data.calc_loop_triangles()
+            proxy.data.calc_loop_triangles()
+            tris_before += len(ob.data.loop_triangles)
+            tris_after += len(proxy.data.loop_triangles)
+
+        self.report({'INFO'}, f'{built} proxy collider(s) built, {kept} up to date, '
+                              f'{tris_before} -> {tris_after} triangles')
+        return {'FINISHED'}
+
+
+class STRA_OT_Fit_Collision_Shapes(Operator):
+    bl_idname = "stra.utils_fit_collision_shapes"
+    bl_label = "Fit collision shapes"
+    bl_description = "Give the rigid bodies of the selected pieces the cheapest collision shape that follows their mesh: box, convex hull or mesh"
+    bl_options = {"UNDO"}
+
+    def execute(self, context):
+        props = context.scene.stra_props_structure
+
+        # pieces weigh by their joints, if there is a structure
+        contacts = {}
+        index = structure_graph.get_index()
+        if index is not None:
+            contacts = dict(zip(index.piece_names, index.adjacency.degrees().tolist()))
+
+        result = ops_structure.assign_collision_shapes(context.selected_objects, contacts, props)
+        self.report({'INFO'}, ops_structure.shapes_result(*result).capitalize())
+        return {'FINISHED'}
+
+
+class STRA_OT_Export_Structure(Operator, ExportHelper):
+    bl_idname = "stra.utils_export_structure"
+    bl_label = "Export structure"
+    bl_description = "Save the joints of the selected objects to a compact .npz file"
+
+    filename_ext = ".npz"
+    filter_glob: bpy.props.StringProperty(default="*.npz", options={'HIDDEN'})
+
+    def execute(self, context):
+        col_joints = utils.get_collection_joints()
+        joints = ops_structure.collect_joints(context.selected_objects, col_joints)
+
+        try:
+            count = structure_file.write_structure(self.filepath, joints)
+        except OSError as e:
+            self.report({'ERROR'}, f'Could not write {self.filepath}: {e}')
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f'Exported {count} joint(s)')
+        return {'FINISHED'}
+
+
+class STRA_OT_Import_Structure(Operator, ImportHelper):
+    bl_idname = "stra.utils_import_structure"
+    bl_label = "Import structure"
+    bl_description = "Create the joints of a structure file between the objects with the same names in this file"
+    bl_options = {"UNDO"}
+
+    filename_ext = ".npz"
+    filter_glob: bpy.props.StringProperty(default="*.npz", options={'HIDDEN'})
+
+    def execute(self, context):
+        try:
+            names, pairs, locations, volumes, settings = structure_file.read_structure(self.filepath)
+        except (OSError, ValueError, KeyError) as e:
+            self.report({'ERROR'}, f'Could not read {self.filepath}: {e}')
+            return {'CANCELLED'}
+
+        objects = [bpy.data.objects.get(name) for name in names]
+        col_joints = utils.get_collection_joints()
+        registry = ops_structure.JointRegistry(col_joints)
+
+        contacts = []
+        rows = []
+        missing = 0
+        existing = 0
+        for row, (a, b) in enumerate(pairs.tolist()):
+            obj1 = objects[a]
+            obj2 = objects[b]
+            if obj1 is None or obj2 is None:
+                missing += 1
+                continue
+            if registry.exists(obj1, obj2):
+                existing += 1
                 continue
+            contacts.append((obj1, obj2, tuple(locations[row].tolist()), float(volumes[row])))
+            rows.append(row)
 
-            for name in ob["joints"][:]:
-                joint_obj = col_joints.objects.get(name)
-                if joint_obj is None:
-                    utils.remove_joint_from_property(ob, name)
-                elif joint_obj not in joint_objs_to_select:
-                    joint_objs_to_select.append(joint_obj)
-
-        bpy.ops.object.select_all(action='DESELECT')
-
-        first_item = True
-        for joint_obj in joint_objs_to_select:
-            joint_obj.select_set(True)
-            if first_item:
-                first_item = False
-                bpy.context.view_layer.objects.active = joint_obj
+        joints = ops_structure.create_joints(col_joints, contacts, context.scene.stra_props_joint)
+
+        # joints are copies of one template, so settings that match it are not written again
+        columns = {key: column.tolist() for key, column in settings.items()}
+        for joint, row in zip(joints, rows):
+            rbc = joint.rigid_body_constraint
+            for key, column in columns.items():
+                if ops_structure.differs(getattr(rbc, key), column[row]):
+                    setattr(rbc, key, column[row])
+
+        result = f'Imported {len(joints)} joint(s)'
+        if existing:
+            result += f', {existing} already exist'
+        if missing:
+            result += f', {missing} skipped because of missing objects'
+        self.report({'INFO'}, result)
+        return {'FINISHED'}
+
+
+class STRA_OT_Clear_Cache(Operator):
+    bl_idname = "stra.utils_clear_cache"
+    bl_label = "Clear cache"
+    bl_description = "Delete the cached overlap results of this file"
+
+    def execute(self, context):
+        if cache.clear_cache():
+            self.report({'INFO'}, 'Cache cleared')
+        else:
+            self.report({'INFO'}, 'No cache file found')
 
         return {'FINISHED'}
\ No newline at end of file
@@ -0,0 +1,222 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# NOTE: this file is also run as a standalone script by the worker processes,
+# keep it free of bpy/mathutils imports
+try:
+    from . import geometry
+except ImportError:
+    import geometry
+
+
+def to_shared(array):
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    spec = {'name': shm.name, 'shape': list(array.shape), 'dtype': array.dtype.str}
+    return shm, spec
+
+
+def attach_shared(spec):
+    try:
+        shm = shared_memory.SharedMemory(name=spec['name'], track=False)
+    except TypeError:
+        # python < 3.13, the worker doesn't own the block,
+        # so its resource tracker must not unlink it on exit
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+    array = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+    return shm, array
+
+
+def pack_pieces(pieces):
+    # pieces is a list of (verts, normals, tris) world space arrays, or None for unused ones
+    vert_offsets = [0]
+    tri_offsets = [0]
+    for arrays in pieces:
+        num_verts = 0 if arrays is None else len(arrays[0])
+        num_tris = 0 if arrays is None else len(arrays[2])
+        vert_offsets.append(vert_offsets[-1] + num_verts)
+        tri_offsets.append(tri_offsets[-1] + num_tris)
+
+    used = [arrays for arrays in pieces if arrays is not None]
+    if used:
+        verts = np.concatenate([a[0] for a in used]).astype(np.float64)
+        normals = np.concatenate([a[1] for a in used]).astype(np.float64)
+        tris = np.concatenate([a[2] for a in used]).astype(np.int32)
+    else:
+        verts = np.zeros((0, 3), dtype=np.float64)
+        normals = np.zeros((0, 3), dtype=np.float64)
+        tris = np.zeros((0, 3), dtype=np.int32)
+
+    return {
+        'verts': verts,
+        'normals': normals,
+        'tris': tris,
+        'vert_offsets': np.array(vert_offsets, dtype=np.int64),
+        'tri_offsets': np.array(tri_offsets, dtype=np.int64),
+    }
+
+
+class WorkerPool:
+    # worker processes that stay alive between batches, so tiled generation doesn't start
+    # new ones for every tile. every batch is a line of JSON on their stdin, EOF ends them
+    def __init__(self, workers):
+        self.procs = []
+        for _ in range(max(1, workers)):
+            self.procs.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                               stdin=subprocess.PIPE, stderr=subprocess.PIPE))
+
+    def check(self):
+        for proc in self.procs:
+            if proc.poll() is not None:
+                raise RuntimeError(f'intersection worker failed:\n{proc.stderr.read().decode()}')
+
+    def kill(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    def close(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                try:
+                    proc.stdin.close()
+                    proc.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    proc.kill()
+                    proc.wait()
+            proc.stderr.close()
+        self.procs = []
+
+    def iter_run(self, pieces, pairs, overlap_margin, resolution, cancelled=None):
+        # yields the finished fraction while the workers run, the results are the return value.
+        # once cancelled() is true the workers are killed and pairs they didn't finish are None
+        if len(pairs) == 0:
+            return []
+
+        workers = len(self.procs)
+        arrays = pack_pieces(pieces)
+        arrays['pairs'] = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        arrays['results'] = np.full((len(pairs), 4), np.nan, dtype=np.float64)
+        arrays['finished'] = np.zeros(len(pairs), dtype=np.int8)
+        arrays['done'] = np.zeros(workers, dtype=np.int64)
+
+        blocks = {}
+        specs = {}
+        try:
+            for key, array in arrays.items():
+                blocks[key], specs[key] = to_shared(array)
+
+            for worker, proc in enumerate(self.procs):
+                spec = {
+                    'arrays': specs,
+                    'worker': worker,
+                    'workers': workers,
+                    'overlap_margin': overlap_margin,
+                    'resolution': resolution,
+                }
+                proc.stdin.write(json.dumps(spec).encode() + b'\n')
+                proc.stdin.flush()
+
+            done = np.ndarray(arrays['done'].shape, dtype=np.int64, buffer=blocks['done'].buf)
+            while int(done.sum()) < len(pairs):
+                if cancelled is not None and cancelled():
+                    self.kill()
+                    break
+                self.check()
+                yield int(done.sum()) / len(pairs)
+                time.sleep(0.02)
+            del done
+
+            results = np.ndarray(arrays['results'].shape, dtype=np.float64, buffer=blocks['results'].buf).copy()
+            finished = np.ndarray(arrays['finished'].shape, dtype=np.int8, buffer=blocks['finished'].buf).copy()
+        except GeneratorExit:
+            # closed in the middle of a batch, the workers would still use the blocks
+            self.kill()
+            raise
+        finally:
+            for shm in blocks.values():
+                shm.close()
+                shm.unlink()
+
+        out = []
+        for (volume, x, y, z), ok in zip(results.tolist(), finished.tolist()):
+            if not ok:
+                out.append(None)
+            elif volume != volume:  # nan, no overlap
+                out.append((0.0, None))
+            else:
+                out.append((volume, (x, y, z)))
+        return out
+
+
+def run_pairs(arrays, spec):
+    verts = arrays['verts']
+    normals = arrays['normals']
+    tris = arrays['tris']
+    vert_offsets = arrays['vert_offsets']
+    tri_offsets = arrays['tri_offsets']
+    pairs = arrays['pairs']
+    results = arrays['results']
+    finished = arrays['finished']
+    done = arrays['done']
+
+    worker = spec['worker']
+    overlap_margin = spec['overlap_margin']
+    resolution = spec['resolution']
+
+    def piece(k):
+        v0, v1 = vert_offsets[k], vert_offsets[k + 1]
+        t0, t1 = tri_offsets[k], tri_offsets[k + 1]
+        return verts[v0:v1], normals[v0:v1], tris[t0:t1]
+
+    for n in range(worker, len(pairs), spec['workers']):
+        i, j = pairs[n]
+        verts1, normals1, tris1 = piece(i)
+        verts2, _, tris2 = piece(j)
+
+        if len(tris1) > 0 and len(tris2) > 0:
+            verts1 = geometry.inflate(verts1, normals1, overlap_margin)
+            volume, centroid = geometry.intersection_volume(verts1, tris1, verts2, tris2, resolution)
+            if centroid is not None:
+                results[n] = (volume, centroid[0], centroid[1], centroid[2])
+
+        # after the result, a killed worker never leaves a finished pair without one
+        finished[n] = 1
+        done[worker] += 1
+
+
+def work(spec):
+    # a worker without pairs in this batch must not attach, the batch can be over and
+    # its blocks unlinked before it gets to it
+    if spec['worker'] >= spec['arrays']['pairs']['shape'][0]:
+        return
+
+    blocks = {}
+    arrays = {}
+    for key, array_spec in spec['arrays'].items():
+        blocks[key], arrays[key] = attach_shared(array_spec)
+
+    run_pairs(arrays, spec)
+
+    # views into the blocks have to be gone before closing them
+    arrays.clear()
+    for shm in blocks.values():
+        shm.close()
+
+
+if __name__ == '__main__':
+    # one batch per line, until the pool closes stdin
+    for line in sys.stdin:
+        work(json.loads(line))
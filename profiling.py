@@ -0,0 +1,116 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# the profiler of the generation that is currently running, helpers use the
+# module level span/count/log functions so they don't need a reference to it
+_active = None
+
+
+def span(name):
+    if _active is None:
+        return nullcontext()
+    return _active.span(name)
+
+
+def count(name, amount=1):
+    if _active is not None:
+        _active.count(name, amount)
+
+
+def log(*args):
+    # per pair console output, turned off in quiet mode
+    if _active is None or not _active.quiet:
+        print(*args)
+
+
+class Profiler:
+    def __init__(self, quiet=False, trace=False, on_event=None):
+        self.quiet = quiet
+        self.trace = trace
+        self.on_event = on_event
+
+        self.spans = {}
+        self.stages = {}
+        self.counters = {}
+        self.events = []
+
+        self.origin = time.perf_counter()
+        self.stage_start = self.origin
+        self.previous = None
+
+    def __enter__(self):
+        global _active
+        self.previous = _active
+        _active = self
+        return self
+
+    def __exit__(self, *args):
+        global _active
+        _active = self.previous
+
+    def record(self, name, start, end):
+        entry = self.spans.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += end - start
+
+        if self.trace:
+            self.events.append((name, start - self.origin, end - start))
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_stage(self, name):
+        # a stage runs from the end of the previous stage until now
+        now = time.perf_counter()
+        seconds = now - self.stage_start
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.trace:
+            self.events.append((f'stage: {name}', self.stage_start - self.origin, seconds))
+        self.stage_start = now
+
+        if self.on_event is not None:
+            self.on_event('stage', stage=name, seconds=seconds)
+
+    def emit(self, name, **data):
+        if self.on_event is not None:
+            self.on_event(name, **data)
+
+    def summary(self):
+        total = sum(self.stages.values()) or 1e-9
+
+        lines = [f"{'stage / span':<24}{'calls':>10}{'total s':>12}{'mean ms':>12}{'%':>8}"]
+        for name, seconds in self.stages.items():
+            lines.append(f"{name:<24}{'':>10}{seconds:>12.3f}{'':>12}{seconds / total * 100:>8.1f}")
+
+        lines.append('')
+        for name, (calls, seconds) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<24}{calls:>10}{seconds:>12.3f}{seconds / calls * 1000:>12.3f}"
+                         f"{seconds / total * 100:>8.1f}")
+
+        if self.counters:
+            lines.append('')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{name:<24}{value:>10}')
+
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        # chrome://tracing / perfetto compatible
+        events = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': seconds * 1e6,
+                   'pid': 0, 'tid': 0 if name.startswith('stage: ') else 1}
+                  for name, start, seconds in self.events]
+        data = {
+            'traceEvents': events,
+            'otherData': {'stages': self.stages, 'counters': self.counters},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
@@ -6,7 +6,8 @@ from . import utils
 class STRA_PGT_Structure(PropertyGroup):
     existing_joint_behaviour_choice = []
     existing_joint_behaviour_choice.append(('NEWONLY', 'New only', 'If there is already a joint between objects, don\'t create a new one'))
-    existing_joint_behaviour_choice.append(('OVERWRITE', 'Overwrite', 'If there is already a joint between objects, delete it and calculate again. Slow'))
+    existing_joint_behaviour_choice.append(('OVERWRITE', 'Overwrite', 'If there is already a joint between overlapping objects, delete it and calculate again'))
+    existing_joint_behaviour_choice.append(('INCREMENTAL', 'Changed only', 'Only recalculate joints of objects that were moved or edited since the last generation'))
     existing_joint_behaviour_choice.append(('NOCHECK', 'Skip checking completely', 'Allow the possibility of duplicate joints between objects. Improves performance when there is a high amount of joints on the scene'))
 
     mode: bpy.props.EnumProperty(
@@ -14,6 +15,30 @@ class STRA_PGT_Structure(PropertyGroup):
         items=[('FAST', "Fast", "Approximates the joint location by just putting it at the midpoint between objects"),
                ('EXACT', "Exact", "Puts the joint exactly at the center of an overlap between objects. Also calculates overlap volume")]
     )
+    exact_method: bpy.props.EnumProperty(
+        name="Intersection",
+        items=[('BOOLEAN', "Boolean", "Intersect the objects with an exact boolean modifier. Slow, creates temporary objects for every overlap"),
+               ('SAMPLED', "Sampled", "Estimate the overlap volume and center by sampling a grid in memory. No temporary objects")]
+    )
+    sample_resolution: bpy.props.IntProperty(
+        name="Sample resolution",
+        min=4,
+        soft_max=64,
+        default=16,
+        description="Samples per axis inside the shared bounding box of two objects"
+    )
+    use_parallel: bpy.props.BoolProperty(
+        name="Parallel",
+        default=False,
+        description="Calculate the sampled intersections in background worker processes"
+    )
+    worker_count: bpy.props.IntProperty(
+        name="Workers",
+        min=1,
+        soft_max=64,
+        default=4,
+        description="Number of worker processes for the parallel intersection calculation"
+    )
     overlap_margin: bpy.props.FloatProperty(
         name="Overlap margin",
         soft_min=0,
@@ -31,10 +56,174 @@ class STRA_PGT_Structure(PropertyGroup):
         step=1,
         description="Don't create joint if the overlap between 2 objects is smaller than this value"
     )
+    margin_mode: bpy.props.EnumProperty(
+        name="Margin mode",
+        items=[('SOLIDIFY', "Solidify", "Thicken every mesh by the overlap margin before checking for overlaps"),
+               ('DISTANCE', "Distance", "Keep the original geometry and treat surfaces closer than the overlap margin as touching. Half the triangles, no solidify pass")]
+    )
+    use_vectorized_bvh: bpy.props.BoolProperty(
+        name="Vectorized mesh reading",
+        default=True,
+        description="Read mesh data straight into NumPy arrays instead of building a bmesh per object. Faster and uses less memory on high-poly pieces"
+    )
+    use_shared_trees: bpy.props.BoolProperty(
+        name="Share trees of linked duplicates",
+        default=True,
+        description="Build one tree per mesh for pieces that share their mesh, instead of one per piece. Needs vectorized mesh reading"
+    )
+    use_proxies: bpy.props.BoolProperty(
+        name="Use proxy colliders",
+        default=False,
+        description="Check overlaps and calculate intersections with the low poly proxy colliders of the pieces that have one"
+    )
+    proxy_method: bpy.props.EnumProperty(
+        name="Proxy",
+        items=[('HULL', "Convex hull", "Wrap the piece in its convex hull. Fastest, but fills in concave parts"),
+               ('DECIMATE', "Decimate", "Collapse edges of the piece down to a ratio of its faces")]
+    )
+    proxy_ratio: bpy.props.FloatProperty(
+        name="Ratio",
+        min=0.001,
+        max=1.0,
+        default=0.1,
+        description="Ratio of faces the decimated proxy keeps"
+    )
+    use_tiles: bpy.props.BoolProperty(
+        name="Tiled",
+        default=False,
+        description="Work through the scene one tile at a time and release the trees of finished tiles. Keeps memory use down on very large scenes"
+    )
+    tile_size: bpy.props.FloatProperty(
+        name="Tile size",
+        min=0.01,
+        soft_max=1000,
+        default=10.0,
+        description="Edge length of a tile. Pieces reaching into a tile are loaded with it, so tiles should be a few pieces wide"
+    )
+    shard_count: bpy.props.IntProperty(
+        name="Processes",
+        min=1,
+        soft_max=64,
+        default=4,
+        description="Number of background blender processes for the generation in background processes"
+    )
+    use_cache: bpy.props.BoolProperty(
+        name="Use cache",
+        default=False,
+        description="Store overlap results in a cache file next to the .blend file, so pairs that didn't change are not calculated again"
+    )
+    cache_max_entries: bpy.props.IntProperty(
+        name="Max cache entries",
+        min=1000,
+        default=500000,
+        description="The least recently used pairs are removed from the cache above this amount"
+    )
     existing_joint_behaviour: bpy.props.EnumProperty(
         name="Existing joint behaviour",
         items=existing_joint_behaviour_choice
     )
+    merge_joints: bpy.props.BoolProperty(
+        name="Merge joints",
+        default=False,
+        description="After generating, merge redundant joints that are close to each other into one. Fewer constraints make the simulation faster"
+    )
+    merge_radius: bpy.props.FloatProperty(
+        name="Merge radius",
+        min=0,
+        soft_max=10,
+        default=0.1,
+        precision=3,
+        step=1,
+        description="Redundant joints closer than this are merged, their overlap volume is added up"
+    )
+    max_joints_per_piece: bpy.props.IntProperty(
+        name="Max joints per piece",
+        min=0,
+        soft_max=32,
+        default=0,
+        description="Merge redundant joints of pieces with more joints than this into their nearest joint. The pieces always stay connected, so this is a target, not a limit. 0 for no limit"
+    )
+    use_collision_shapes: bpy.props.BoolProperty(
+        name="Fit collision shapes",
+        default=False,
+        description="After generating, give the rigid bodies of the pieces the cheapest collision shape that follows their mesh: box, convex hull or mesh"
+    )
+    shape_box_fill: bpy.props.FloatProperty(
+        name="Box fill",
+        min=0,
+        max=1,
+        default=0.95,
+        description="Pieces that fill at least this much of their bounding box get a box shape"
+    )
+    shape_hull_fill: bpy.props.FloatProperty(
+        name="Hull fill",
+        min=0,
+        max=1,
+        default=0.9,
+        description="Pieces that fill at least this much of their convex hull get a convex hull shape, less convex ones a mesh shape"
+    )
+    prune_extra_joints: bpy.props.IntProperty(
+        name="Extra joints per piece",
+        min=0,
+        soft_max=16,
+        default=2,
+        description="Pruning keeps the joints needed to connect every piece plus this many of the strongest other joints per piece"
+    )
+    analysis_safety: bpy.props.FloatProperty(
+        name="Safety factor",
+        min=0.01,
+        soft_max=100,
+        default=2.0,
+        description="Breaking thresholds from the load analysis are this many times the load a joint carries at rest"
+    )
+    query: bpy.props.EnumProperty(
+        name="Query",
+        items=[('NEIGHBOURS', "Neighbours", "Pieces up to a number of joints away from the selected pieces"),
+               ('ISLANDS', "Islands", "Pieces connected to the selected pieces through any amount of joints"),
+               ('WEAK', "Weak joints", "Joints with an overlap volume or breaking threshold below a cutoff"),
+               ('DEGREE', "Many joints", "Pieces with more joints than a number")]
+    )
+    query_hops: bpy.props.IntProperty(
+        name="Joints away",
+        min=1,
+        soft_max=16,
+        default=1
+    )
+    query_weak_by: bpy.props.EnumProperty(
+        name="By",
+        items=[('VOLUME', "Volume", "Compare the overlap volume"),
+               ('THRESHOLD', "Threshold", "Compare the breaking threshold")]
+    )
+    query_cutoff: bpy.props.FloatProperty(
+        name="Below",
+        min=0,
+        default=0.01,
+        precision=3,
+        step=1
+    )
+    query_degree: bpy.props.IntProperty(
+        name="More than",
+        min=0,
+        default=8
+    )
+    quiet: bpy.props.BoolProperty(
+        name="Quiet",
+        default=False,
+        description="Don't print every pair to the console, only the stages and the summary"
+    )
+    profile_path: bpy.props.StringProperty(
+        name="Profile",
+        default="",
+        subtype='FILE_PATH',
+        description="Write a Chrome trace (JSON) of the generation to this file. Leave empty to skip"
+    )
+    frame_budget: bpy.props.IntProperty(
+        name="Frame budget (ms)",
+        default=30,
+        min=5,
+        max=1000,
+        description="How long the generation works before letting the interface redraw. Press Esc to stop early and keep the joints found so far"
+    )
     progress: bpy.props.FloatProperty(
         name="Progress",
         min=0.0,
@@ -0,0 +1,85 @@
+import bpy
+import json
+import os
+import subprocess
+import time
+
+# runs parts of a generation in background blender processes. every worker opens a copy
+# of the current file and runs batch.py with a "shard" config, see ops_structure
+
+BATCH_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch.py')
+
+# settings the workers always use, existing joints and merging are handled when
+# the results come back, and a cache next to the temporary copy is of no use
+WORKER_SETTINGS = {
+    'existing_joint_behaviour': 'NOCHECK',
+    'merge_joints': False,
+    'use_cache': False,
+    'quiet': True,
+    'profile_path': '',
+}
+
+
+def launch_workers(shards, tmpdir):
+    # shards is a list of (object names, axis, lo, hi)
+    source = os.path.join(tmpdir, 'source.blend')
+    bpy.ops.wm.save_as_mainfile(filepath=source, copy=True)
+
+    # the cores are split between the shards, so parallel intersections don't oversubscribe
+    settings = dict(WORKER_SETTINGS, worker_count=max(1, (os.cpu_count() or 1) // len(shards)))
+
+    workers = []
+    for k, (names, axis, lo, hi) in enumerate(shards):
+        output = os.path.join(tmpdir, f'shard_{k}.json')
+        config = {
+            'objects': names,
+            'structure': settings,
+            'shard': {'axis': axis, 'lo': lo, 'hi': hi, 'output': output},
+        }
+        config_path = os.path.join(tmpdir, f'shard_{k}_config.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        log_path = os.path.join(tmpdir, f'shard_{k}.log')
+        with open(log_path, 'w') as log:
+            proc = subprocess.Popen([bpy.app.binary_path, '-b', '--factory-startup', source,
+                                     '--python', BATCH_SCRIPT, '--', '--config', config_path,
+                                     '--log', os.path.join(tmpdir, f'shard_{k}.jsonl')],
+                                    stdout=log, stderr=subprocess.STDOUT)
+        workers.append((proc, output, log_path))
+
+    return workers
+
+
+def wait_workers(workers, progress=None):
+    try:
+        while True:
+            running = sum(proc.poll() is None for proc, _, _ in workers)
+            if progress is not None:
+                progress(len(workers) - running)
+            if running == 0:
+                break
+            time.sleep(0.2)
+    finally:
+        for proc, _, _ in workers:
+            if proc.poll() is None:
+                proc.kill()
+
+    for proc, output, log_path in workers:
+        if proc.returncode != 0 or not os.path.exists(output):
+            with open(log_path) as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f'shard worker failed:\n{tail}')
+
+
+def merge_results(workers):
+    # (name1, name2, loc, volume) of all shards, every pair once, sorted by name
+    # so the joints come out the same no matter which worker finished first
+    merged = {}
+    for _, output, _ in workers:
+        with open(output) as f:
+            for name1, name2, loc, volume in json.load(f):
+                key = (name1, name2) if name1 < name2 else (name2, name1)
+                merged.setdefault(key, (name1, name2, tuple(loc), volume))
+
+    return [merged[key] for key in sorted(merged)]
@@ -0,0 +1,64 @@
+import numpy as np
+
+# columnar .npz file of a joint graph: an object name table, pair indices into it,
+# locations, volumes and one column per constraint setting
+
+VERSION = 1
+
+SETTINGS = ['type', 'disable_collisions', 'use_breaking', 'breaking_threshold']
+for kind in ('ang', 'lin'):
+    for axis in 'xyz':
+        SETTINGS += [f'use_limit_{kind}_{axis}', f'limit_{kind}_{axis}_lower', f'limit_{kind}_{axis}_upper']
+
+
+def column_dtype(value):
+    if isinstance(value, bool):
+        return bool
+    if isinstance(value, float):
+        return np.float32
+    return str
+
+
+def write_structure(path, joints):
+    # joints connecting two objects, returns the number of written joints
+    names = {}
+    pairs = []
+    locations = []
+    volumes = []
+    settings = {key: [] for key in SETTINGS}
+    for joint in joints:
+        rbc = joint.rigid_body_constraint
+        if rbc is None or rbc.object1 is None or rbc.object2 is None:
+            continue
+
+        pairs.append((names.setdefault(rbc.object1.name, len(names)),
+                      names.setdefault(rbc.object2.name, len(names))))
+        locations.append(joint.location[:])
+        volumes.append(joint.get('intersection_volume', 1.0))
+        for key, column in settings.items():
+            column.append(getattr(rbc, key))
+
+    columns = {f'rbc_{key}': np.array(column, dtype=column_dtype(column[0]) if column else np.float32)
+               for key, column in settings.items()}
+
+    np.savez_compressed(
+        path,
+        version=np.array(VERSION),
+        names=np.array(list(names), dtype=str),
+        pairs=np.array(pairs, dtype=np.int32).reshape(-1, 2),
+        locations=np.array(locations, dtype=np.float32).reshape(-1, 3),
+        volumes=np.array(volumes, dtype=np.float32),
+        **columns
+    )
+    return len(pairs)
+
+
+def read_structure(path):
+    # returns (names, pairs, locations, volumes, {setting: column})
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data['version'])
+        if version > VERSION:
+            raise ValueError(f'structure file version {version} is newer than this addon supports')
+
+        settings = {key: data[f'rbc_{key}'] for key in SETTINGS if f'rbc_{key}' in data}
+        return (data['names'].tolist(), data['pairs'], data['locations'], data['volumes'], settings)
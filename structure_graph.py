@@ -0,0 +1,87 @@
+import bpy
+import numpy as np
+from . import utils, graph
+
+# index of the generated structure for queries, built from the joints collection and kept
+# until the structure changes (see handlers). only names are stored, no object references,
+# so an undo can't leave it pointing at freed data
+
+_index = None
+
+
+class StructureIndex:
+    def __init__(self, col_joints):
+        pieces = {}
+        edges = []
+        joint_names = []
+        volumes = []
+        thresholds = []
+        for joint in col_joints.objects:
+            rbc = joint.rigid_body_constraint
+            if rbc is None or rbc.object1 is None or rbc.object2 is None:
+                continue
+            edges.append((pieces.setdefault(rbc.object1.name, len(pieces)),
+                          pieces.setdefault(rbc.object2.name, len(pieces))))
+            joint_names.append(joint.name)
+            volumes.append(joint.get('intersection_volume', 1.0))
+            thresholds.append(rbc.breaking_threshold)
+
+        self.scene = bpy.context.scene.as_pointer()
+        self.piece_names = list(pieces)
+        self.piece_index = pieces
+        self.joint_names = joint_names
+        self.edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        self.volumes = np.array(volumes, dtype=np.float64)
+        self.thresholds = np.array(thresholds, dtype=np.float64)
+        self.adjacency = graph.Adjacency(self.edges, len(pieces))
+        self._labels = None
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = graph.component_labels(self.edges, len(self.piece_names))
+        return self._labels
+
+    def seeds(self, objects):
+        return np.array([self.piece_index[ob.name] for ob in objects if ob.name in self.piece_index],
+                        dtype=np.int64)
+
+    def seed_mask(self, objects):
+        mask = np.zeros(len(self.piece_names), dtype=bool)
+        mask[self.seeds(objects)] = True
+        return mask
+
+    # every query returns (piece mask, joint mask)
+
+    def joints_of(self, objects):
+        selected = self.seed_mask(objects)
+        return None, selected[self.edges[:, 0]] | selected[self.edges[:, 1]]
+
+    def neighbourhood(self, objects, hops):
+        return self.adjacency.k_hop(self.seeds(objects), hops), None
+
+    def islands(self, objects):
+        labels = self.labels
+        return np.isin(labels, labels[self.seeds(objects)]), None
+
+    def weak_joints(self, cutoff, by_volume=True):
+        values = self.volumes if by_volume else self.thresholds
+        return None, values < cutoff
+
+    def high_degree(self, degree):
+        return self.adjacency.degrees() > degree, None
+
+
+def get_index():
+    global _index
+    if _index is None or _index.scene != bpy.context.scene.as_pointer():
+        col_joints = utils.get_collection_joints(create=False)
+        if col_joints is None:
+            return None
+        _index = StructureIndex(col_joints)
+    return _index
+
+
+def invalidate():
+    global _index
+    _index = None
@@ -1,6 +1,6 @@
 import bpy
 from bpy.types import Panel, Operator, PropertyGroup
-from . import utils, ops_structure
+from . import utils, ops_structure, handlers
 import bmesh
 
 
@@ -19,16 +19,9 @@ class STRA_PT_Joint(Panel):
 
         col_joints = utils.get_collection_joints(False)
 
-        all_objects_have_rigidbody = True
-        mesh_amount = 0
-        for ob in context.selected_objects:
-            if ob.rigid_body is None:
-                all_objects_have_rigidbody = False
-            if ob.type != 'MESH':
-                continue
-            if utils.OBJNAME_COLLIDER in ob.name:
-                continue
-            mesh_amount += 1
+        stats = handlers.selection_stats(context)
+        all_objects_have_rigidbody = stats.all_rigid_body
+        mesh_amount = stats.pieces
 
         layout.label(text=f'{mesh_amount} mesh object(s) selected')
 
@@ -67,12 +60,50 @@ class STRA_PT_Joint(Panel):
             r.scale_y = 2
             r.operator("stra.structure_modify", icon='MOD_NORMALEDIT', text=f'Apply to joints of selected objects')
 
+            r = layout.row()
+            r.operator("stra.structure_analyze", icon='FORCE_FORCE')
+            r.prop(props_structure, "analysis_safety", text="Safety")
+
         layout.separator(factor=2)
 
         layout.prop(props_structure, "overlap_margin")
+        layout.prop(props_structure, "margin_mode")
+        layout.prop(props_structure, "use_vectorized_bvh")
+        r = layout.row()
+        r.enabled = props_structure.use_vectorized_bvh
+        r.prop(props_structure, "use_shared_trees")
+        layout.prop(props_structure, "use_proxies")
 
         if props_structure.mode == "EXACT":
             layout.prop(props_structure, "min_overlap_threshold")
+            layout.prop(props_structure, "exact_method")
+            if props_structure.exact_method == 'SAMPLED':
+                layout.prop(props_structure, "sample_resolution")
+                r = layout.row()
+                r.prop(props_structure, "use_parallel")
+                c = r.column()
+                c.enabled = props_structure.use_parallel
+                c.prop(props_structure, "worker_count")
+
+        r = layout.row()
+        r.prop(props_structure, "use_tiles")
+        c = r.column()
+        c.enabled = props_structure.use_tiles
+        c.prop(props_structure, "tile_size")
+
+        r = layout.row()
+        r.prop(props_structure, "use_cache")
+        c = r.column()
+        c.enabled = props_structure.use_cache
+        c.prop(props_structure, "cache_max_entries", text="Max")
+
+        layout.prop(props_structure, "merge_joints")
+        c = layout.column()
+        c.enabled = props_structure.merge_joints
+        c.prop(props_structure, "merge_radius")
+        c.prop(props_structure, "max_joints_per_piece")
+
+        layout.prop(props_structure, "use_collision_shapes")
 
         layout.separator(factor=0.1)
         r = layout.row()
@@ -82,7 +113,7 @@ class STRA_PT_Joint(Panel):
 
         if props_structure.progress > 0.0 and props_structure.progress < 1.0:
             r = layout.row()
-            r.label(text=f"Progress: {props_structure.progress*100:.2f}%")
+            r.label(text=f"Progress: {props_structure.progress*100:.2f}% (Esc to cancel)")
 
         if mesh_amount > 1:
             r = layout.row()
@@ -90,6 +121,10 @@ class STRA_PT_Joint(Panel):
             txt_button = f'Generate between {mesh_amount} objects'
             r.operator("stra.structure_generate", icon='MOD_MESHDEFORM', text=txt_button)
 
+            r = layout.row()
+            r.operator("stra.structure_generate_sharded", icon='SYSTEM')
+            r.prop(props_structure, "shard_count")
+
 
 
 class STRA_PT_Utilities(Panel):
@@ -103,19 +138,57 @@ class STRA_PT_Utilities(Panel):
 
     def draw(self, context):
         layout = self.layout
+        props_structure = context.scene.stra_props_structure
 
-        amount_selected_meshes = 0
-        joints = []
-        for ob in context.selected_objects:
-            if ob.type == 'MESH':
-                amount_selected_meshes += 1
-                if ob.get("joints"):
-                    for name in ob["joints"]:
-                        if name not in joints:
-                            joints.append(name)
-        layout.label(text=f'{amount_selected_meshes} selected meshes')
-        layout.label(text=f'with {len(joints)} joints')
+        stats = handlers.selection_stats(context)
+        layout.label(text=f'{stats.meshes} selected meshes')
+        layout.label(text=f'with {stats.joints} joints')
 
         r = layout.row()
         r.operator("stra.utils_select_joints", icon='ACTION_TWEAK', text="Select joints", )
-        r.enabled = len(joints) > 0
\ No newline at end of file
+        r.enabled = stats.joints > 0
+
+        b = layout.box()
+        b.prop(props_structure, "query", text="")
+        if props_structure.query == 'NEIGHBOURS':
+            b.prop(props_structure, "query_hops")
+        elif props_structure.query == 'WEAK':
+            r = b.row()
+            r.prop(props_structure, "query_weak_by", text="")
+            r.prop(props_structure, "query_cutoff")
+        elif props_structure.query == 'DEGREE':
+            b.prop(props_structure, "query_degree")
+        b.operator("stra.utils_query_structure", icon='RESTRICT_SELECT_OFF')
+
+        c = layout.column()
+        c.enabled = stats.joints > 0
+        c.operator("stra.structure_merge_joints", icon='AUTOMERGE_ON')
+        r = c.row()
+        r.operator("stra.structure_prune", icon='OUTLINER')
+        r.prop(props_structure, "prune_extra_joints", text="Extra")
+
+        r = layout.row(align=True)
+        c = r.column(align=True)
+        c.enabled = stats.joints > 0
+        c.operator("stra.utils_export_structure", icon='EXPORT', text="Export")
+        r.operator("stra.utils_import_structure", icon='IMPORT', text="Import")
+
+        layout.separator(factor=1)
+        r = layout.row()
+        r.prop(props_structure, "proxy_method", text="")
+        c = r.column()
+        c.enabled = props_structure.proxy_method == 'DECIMATE'
+        c.prop(props_structure, "proxy_ratio")
+        layout.operator("stra.utils_generate_colliders", icon='MESH_ICOSPHERE')
+
+        r = layout.row(align=True)
+        r.prop(props_structure, "shape_box_fill")
+        r.prop(props_structure, "shape_hull_fill")
+        layout.operator("stra.utils_fit_collision_shapes", icon='MESH_CUBE')
+
+        layout.operator("stra.utils_clear_cache", icon='TRASH')
+
+        layout.separator(factor=1)
+        layout.prop(props_structure, "quiet")
+        layout.prop(props_structure, "frame_budget")
+        layout.prop(props_structure, "profile_path")
\ No newline at end of file
@@ -76,4 +76,12 @@ def remove_joint_from_property(ob, joint_name):
         return
 
     new_joints = [name for name in ob["joints"] if name != joint_name]
-    ob["joints"] = new_joints
\ No newline at end of file
+    ob["joints"] = new_joints
+
+
+def remove_joints_from_property(ob, joint_names):
+    # joint_names is a set, the property is written once
+    if "joints" not in ob:
+        return
+
+    ob["joints"] = [name for name in ob["joints"] if name not in joint_names]